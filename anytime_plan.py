@@ -0,0 +1,96 @@
+import threading
+import traceback
+
+class AnytimePlan:
+    """
+        A plan that keeps improving in a background thread, returned by
+        Pathfinder.plan_anytime. A flyable plan is available as soon as the
+        AnytimePlan exists; get_path always returns the best one so far.
+
+        Each better plan is also passed to *callback*(path, improvement),
+        from the worker thread. Poll done() or wait() for the refinement to
+        end, and cancel() to end it early. If refining raised an exception,
+        *error* holds its traceback and the last plan published is kept.
+    """
+
+    def __init__(self, path, order, refine, callback = None):
+        """
+            *path* and *order* are the initial plan. *refine* is run in the
+            worker thread as refine(publish, should_stop), and must call
+            publish(path, order, improvement) for each better plan and stop
+            once should_stop() returns True.
+        """
+        self.updates = 0
+        self.error = None
+        self.__path = path
+        self.__order = order
+        self.__improvement = 0.0
+        self.__callback = callback
+        self.__lock = threading.Lock()
+        self.__cancelled = threading.Event()
+
+        self.__thread = threading.Thread(target = self.__refine, args = (refine,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __refine(self, refine):
+        try:
+            refine(self.__publish, self.__cancelled.is_set)
+        except Exception:
+            self.error = traceback.format_exc()
+
+    def __publish(self, path, order, improvement):
+        with self.__lock:
+            self.__path = path
+            self.__order = order
+            self.__improvement = improvement
+            self.updates += 1
+        if self.__callback is not None:
+            self.__callback(path, improvement)
+
+    def get_path(self):
+        """
+            Returns the best path found so far
+        """
+        with self.__lock:
+            return self.__path
+
+    def get_segment_order(self):
+        """
+            Returns the order of the line segments in the best path found so
+            far, see Pathfinder.get_segment_order
+        """
+        with self.__lock:
+            return self.__order
+
+    def get_improvement(self):
+        """
+            Returns how much shorter the best path found so far is than the
+            initial one
+        """
+        with self.__lock:
+            return self.__improvement
+
+    def cancel(self):
+        """
+            Asks the refinement to stop. The best path so far is kept.
+        """
+        self.__cancelled.set()
+
+    def cancelled(self):
+        return self.__cancelled.is_set()
+
+    def done(self):
+        """
+            Returns True once the refinement has stopped, because it could
+            not improve the path any more, ran out of time or was cancelled
+        """
+        return not self.__thread.is_alive()
+
+    def wait(self, timeout = None):
+        """
+            Waits up to *timeout* seconds (forever if None) for the
+            refinement to stop. Returns done().
+        """
+        self.__thread.join(timeout)
+        return self.done()
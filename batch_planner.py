@@ -0,0 +1,153 @@
+import cPickle
+import multiprocessing
+import traceback
+from itertools import imap, izip
+
+import geometry_operations
+from pathfinder import Pathfinder
+
+COSTS = {
+    # Total distance flown
+    "length": geometry_operations.path_length,
+    # Number of times the plane changes direction
+    "turns": geometry_operations.count_turns
+}
+
+class MissionResult:
+    """
+        The outcome of one planned job. *index* is the position of the job
+        in the input. On success, *path* holds the planned path, *options*
+        the options it was planned with (see Pathfinder.get_options) and
+        *segment_order* the order it flies the line segments in (see
+        Pathfinder.get_segment_order), and *error* is None. On failure,
+        they are None and *error* holds the traceback of the exception that
+        was raised.
+
+        Only these are sent back from the worker processes, rather than the
+        Pathfinder with the results of all its stages.
+    """
+
+    def __init__(self, index, path = None, options = None, segment_order = None,
+                 error = None):
+        self.index = index
+        self.path = path
+        self.options = options
+        self.segment_order = segment_order
+        self.error = error
+
+    def succeeded(self):
+        return self.error is None
+
+def _plan(index, job):
+    """
+        Plans *job*, a tuple of the arguments to Pathfinder, and returns its
+        MissionResult
+    """
+    finder = Pathfinder(*job)
+    return MissionResult(index, finder.get_path(), finder.get_options(),
+                         finder.get_segment_order())
+
+def _plan_wind_angle(indexed_job):
+    """
+        Plans the search for one wind angle of a sweep, and returns its
+        MissionResult and cost. Runs in a worker process, so it must stay a
+        module level function.
+    """
+    index, (plane_location, searcharea, boundaries, options, cost) = indexed_job
+    result = _plan(index, (plane_location, searcharea, boundaries, options))
+    return result, COSTS[cost](result.path)
+
+def _plan_mission(indexed_job):
+    """
+        Plans one job of plan_missions. Runs in a worker process, so it must
+        stay a module level function. The result is pickled here, so that a
+        job whose result can't be sent back fails on its own rather than
+        ending the batch.
+    """
+    index, job = indexed_job
+    try:
+        result = _plan(index, job)
+        cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        return result
+    except Exception:
+        return MissionResult(index, error = traceback.format_exc())
+
+def _map(function, jobs, processes, chunksize = None, ordered = True):
+    """
+        Lazily maps *function* over the list *jobs* using a pool of
+        *processes* worker processes (all cores if None), handing them out
+        *chunksize* jobs at a time. Yields results in the order of *jobs*,
+        or as they complete if *ordered* is False. One process runs the jobs
+        in this process.
+    """
+    if processes == 1:
+        for result in imap(function, jobs):
+            yield result
+        return
+
+    processes = processes or multiprocessing.cpu_count()
+    chunksize = chunksize or max(1, len(jobs) // (4 * processes))
+    pool = multiprocessing.Pool(processes)
+    try:
+        pool_map = pool.imap if ordered else pool.imap_unordered
+        for result in pool_map(function, jobs, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def iter_missions(jobs, processes = None, chunksize = None, ordered = False):
+    """
+        Plans each job in *jobs* on a pool of *processes* worker processes
+        (all cores if None), handing them out *chunksize* jobs at a time.
+        Each job is a tuple of the arguments to Pathfinder: (plane_location,
+        searcharea, boundaries) or (plane_location, searcharea, boundaries,
+        options).
+
+        Yields a MissionResult for each job as soon as it completes, or in
+        the order of *jobs* if *ordered* is True. A job that fails yields a
+        MissionResult holding its error; the other jobs carry on.
+    """
+    indexed_jobs = list(enumerate(jobs))
+    return _map(_plan_mission, indexed_jobs, processes, chunksize, ordered)
+
+def plan_missions(jobs, processes = None, chunksize = None):
+    """
+        Plans every job in *jobs*, like iter_missions, and returns the list of
+        MissionResults in the order of *jobs*
+    """
+    return list(iter_missions(jobs, processes, chunksize, ordered = True))
+
+def sweep_wind_angles(plane_location, searcharea, boundaries, options, angles,
+                      cost = "length", processes = None):
+    """
+        Plans the search area once for each wind angle in *angles* (in
+        degrees), across a pool of *processes* worker processes, and picks
+        the cheapest plan. *cost* is a key of COSTS. *options* are passed to
+        each Pathfinder, with "wind_angle_degrees" replaced.
+
+        Returns the MissionResult of the cheapest plan, whose index is that
+        of its angle in *angles*, and a list of (angle, cost) pairs for every
+        angle. Ties go to the angle that comes first.
+    """
+    assert len(angles) > 0
+    if cost not in COSTS:
+        raise ValueError("Unknown cost: %s" % cost)
+
+    def with_angle(angle):
+        angle_options = dict(options)
+        angle_options["wind_angle_degrees"] = angle
+        return angle_options
+
+    jobs = [(plane_location, searcharea, boundaries, with_angle(angle), cost)
+            for angle in angles]
+
+    best_result, best_cost = None, None
+    costs = []
+    for angle, (result, angle_cost) in izip(angles,
+            _map(_plan_wind_angle, list(enumerate(jobs)), processes)):
+        costs.append((angle, angle_cost))
+        if best_cost is None or angle_cost < best_cost:
+            best_result, best_cost = result, angle_cost
+
+    return best_result, costs
@@ -0,0 +1,224 @@
+"""
+    Benchmarks planning and exporting on seeded synthetic search areas.
+
+    python benchmark.py --output results.json
+        Runs the benchmarks and saves the results as JSON
+    python benchmark.py --baseline baseline.json
+        Also compares the results with those saved in baseline.json, and
+        exits with status 1 if any of them regressed
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from math import pi
+from StringIO import StringIO
+
+import numpy
+from pathfinder import Pathfinder
+from mission_exporter import EXPORTERS
+
+POLYGON_KINDS = ["convex", "concave", "star", "many_vertex"]
+PATH_WIDTHS = [61, 30, 15]
+RADIUS = 1000.0
+
+# Exporters that write to a file name rather than to a file object
+FILE_EXPORTERS = ["image", "mission"]
+
+def generate_polygon(kind, seed):
+    """
+        Returns a search area of the given *kind* (see POLYGON_KINDS), about
+        2 * RADIUS across and centered on the origin. The same *kind* and
+        *seed* always give the same polygon.
+
+        All of them are star-shaped around the origin, so they never
+        intersect themselves: their vertices are at increasing angles, at
+        distances that vary more for the more complex kinds.
+    """
+    random = numpy.random.RandomState(seed)
+    if kind == "convex":
+        # Points on an ellipse are always in convex position
+        angles = numpy.sort(random.uniform(0, 2*pi, 12))
+        radii = RADIUS * numpy.hypot(numpy.cos(angles),
+                                     random.uniform(0.5, 1) * numpy.sin(angles))
+    elif kind == "concave":
+        angles = numpy.sort(random.uniform(0, 2*pi, 16))
+        radii = RADIUS * random.uniform(0.4, 1, 16)
+    elif kind == "star":
+        points = random.randint(5, 9)
+        angles = numpy.arange(2 * points) * pi / points
+        radii = RADIUS * numpy.where(numpy.arange(2 * points) % 2, 0.4, 1)
+    elif kind == "many_vertex":
+        angles = numpy.sort(random.uniform(0, 2*pi, 2000))
+        radii = RADIUS * (0.8 + 0.2 * numpy.sin(7 * angles) +
+                          random.uniform(-0.05, 0.05, 2000))
+    else:
+        raise ValueError("Unknown polygon kind: %s" % kind)
+
+    return zip(radii * numpy.cos(angles), radii * numpy.sin(angles))
+
+def _run_case(case):
+    """
+        Runs one benchmark case, timing each stage of planning and each
+        exporter *repeats* times and keeping the fastest time. Runs in a
+        fresh worker process, so that the peak memory it reports is its own.
+    """
+    kind, seed, path_width, repeats = case
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    searcharea = generate_polygon(kind, seed)
+    plane_location = (-2 * RADIUS, -2 * RADIUS)
+    options = { "path_width": path_width, "wind_angle_degrees": 30 }
+
+    stages = dict((name, float("inf")) for name, inputs in Pathfinder.STAGES)
+    for repeat in range(repeats):
+        finder = Pathfinder(plane_location, searcharea, searcharea, options)
+        for name, inputs in Pathfinder.STAGES:
+            start = time.time()
+            finder.get_stage(name)
+            stages[name] = min(stages[name], time.time() - start)
+
+    exporters = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for name in sorted(EXPORTERS):
+            exporters[name] = float("inf")
+            for repeat in range(repeats):
+                if name in FILE_EXPORTERS:
+                    output = os.path.join(directory, name)
+                else:
+                    output = StringIO()
+                start = time.time()
+                try:
+                    EXPORTERS[name](finder, output)
+                except ImportError:
+                    # The imaging library isn't installed
+                    del exporters[name]
+                    break
+                exporters[name] = min(exporters[name], time.time() - start)
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        "name": "%s-%d-w%g" % (kind, seed, path_width),
+        "kind": kind,
+        "seed": seed,
+        "path_width": path_width,
+        "vertices": len(searcharea),
+        "line_segments": len(finder.get_stage("line_segments")),
+        "waypoints": len(finder.get_path()),
+        "stages": stages,
+        "exporters": exporters,
+        # Linux reports the peak resident set size in kilobytes. A worker
+        # process starts out with the resident set of the process that
+        # forked it, which is kept to tell how much the case itself added.
+        "start_rss_kb": start_rss,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+def run_benchmarks(kinds = POLYGON_KINDS, path_widths = PATH_WIDTHS, seeds = (0,),
+                   repeats = 3):
+    """
+        Runs a benchmark case for each combination of polygon kind, path
+        width and seed, each in its own process, one at a time. Returns the
+        results as a dict that can be saved as JSON.
+    """
+    cases = [(kind, seed, path_width, repeats) for kind in kinds
+             for seed in seeds for path_width in path_widths]
+    pool = multiprocessing.Pool(1, maxtasksperchild = 1)
+    try:
+        results = pool.map(_run_case, cases, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "cases": results
+    }
+
+def compare(results, baseline, threshold = 0.25, minimum_seconds = 0.005,
+            minimum_kb = 1024):
+    """
+        Compares *results* with the *baseline* results, case by case.
+        Returns the regressions, as a list of (case, metric, baseline value,
+        value) for every time that grew by more than *threshold* (as a
+        fraction) and by more than *minimum_seconds*, and for the memory a
+        case added to its worker's peak that grew by more than *threshold*
+        and by more than *minimum_kb*. Cases and metrics missing from either
+        are ignored.
+    """
+    def added_rss(case):
+        if "start_rss_kb" not in case or "peak_rss_kb" not in case:
+            return None
+        return case["peak_rss_kb"] - case["start_rss_kb"]
+
+    baseline_cases = dict((case["name"], case) for case in baseline["cases"])
+    regressions = []
+    for case in results["cases"]:
+        if case["name"] not in baseline_cases:
+            continue
+        old_case = baseline_cases[case["name"]]
+
+        for group in ("stages", "exporters"):
+            for metric, seconds in sorted(case[group].items()):
+                old_seconds = old_case.get(group, {}).get(metric)
+                if old_seconds is not None and \
+                   seconds > old_seconds * (1 + threshold) and \
+                   seconds - old_seconds > minimum_seconds:
+                    regressions.append((case["name"], "%s.%s" % (group, metric),
+                                        old_seconds, seconds))
+
+        # The worker's peak includes what it was forked with, which depends
+        # on the process that ran the benchmark rather than on the case
+        old_rss, rss = added_rss(old_case), added_rss(case)
+        if old_rss is not None and rss is not None and \
+           rss > old_rss * (1 + threshold) and rss - old_rss > minimum_kb:
+            regressions.append((case["name"], "added_rss_kb", old_rss, rss))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks Pathfinder")
+    parser.add_argument("--output", help = "file to save the results to")
+    parser.add_argument("--baseline", help = "results to compare with")
+    parser.add_argument("--threshold", type = float, default = 0.25,
+                        help = "fraction by which a metric may grow")
+    parser.add_argument("--repeats", type = int, default = 3)
+    parser.add_argument("--seeds", type = int, default = 1,
+                        help = "number of polygons of each kind")
+    parser.add_argument("--kinds", nargs = "+", default = POLYGON_KINDS,
+                        choices = POLYGON_KINDS)
+    parser.add_argument("--path-widths", nargs = "+", type = float,
+                        default = PATH_WIDTHS)
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.kinds, arguments.path_widths,
+                             range(arguments.seeds), arguments.repeats)
+    for case in results["cases"]:
+        print "%-24s %7d waypoints  plan %.3fs  added %d kB" % (case["name"],
+                case["waypoints"], sum(case["stages"].values()),
+                case["peak_rss_kb"] - case["start_rss_kb"])
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent = 2, sort_keys = True)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  arguments.threshold)
+        for name, metric, old_value, value in regressions:
+            print "REGRESSION %s %s: %g -> %g" % (name, metric, old_value, value)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,62 @@
-import scipy, numpy
+import numpy
 import shapely.geometry
-from math import pi, sqrt
-from scipy import dot, cos, sin
+from math import pi, sqrt, cos, sin
+from numpy.lib.stride_tricks import as_strided
+
+class Path:
+    """
+        A sequence of points, backed by a contiguous (N, 2) float64 array.
+        Indexing and iterating yield the points as rows of that array.
+    """
+
+    def __init__(self, points):
+        self.points = numpy.ascontiguousarray(points, dtype=float).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Path(self.points[index])
+        return self.points[index]
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __array__(self, dtype = None):
+        if dtype is None:
+            return self.points
+        return self.points.astype(dtype)
+
+    def __repr__(self):
+        return "Path(%r)" % self.points
+
+    def get_legs(self):
+        """
+            Returns the N - 1 legs between consecutive points, as a read-only
+            (N - 1, 2, 2) view of the points
+        """
+        row_stride, column_stride = self.points.strides
+        return as_strided(self.points, shape = (max(len(self) - 1, 0), 2, 2),
+                          strides = (row_stride, row_stride, column_stride),
+                          writeable = False)
+
+    def get_sequential_duplicates(self):
+        """
+            Returns a boolean array that is True for each point that is
+            identical to the point before it
+        """
+        duplicates = numpy.zeros(len(self), dtype = bool)
+        duplicates[1:] = (self.points[1:] == self.points[:-1]).all(axis = 1)
+        return duplicates
+
+    def remove_sequential_duplicates(self):
+        """
+            Returns a copy of the path without sequential identical points.
+            The copy may still have duplicates, but it will not have any
+            **sequential** duplicates.
+        """
+        return Path(self.points[~self.get_sequential_duplicates()])
 
 def get_bounding_box(points):
     """
@@ -33,14 +88,12 @@ def compute_ratio(bounding_box):
 def rotate(points, cnt, angle_radians):
     """
         Returns a copy of *points*, rotated around *cnt* by
-        *angle_radians*
+        *angle_radians*, as an (N, 2) array
     """
-    ar = scipy.array
-
-    pts = ar(points)
-    rotated = dot(pts-cnt, ar([[cos(angle_radians), sin(angle_radians)], \
-              [-sin(angle_radians), cos(angle_radians)]]))+cnt
-    return list(rotated)
+    pts = numpy.asarray(points, dtype = float).reshape(-1, 2)
+    rotation = numpy.array([[cos(angle_radians), sin(angle_radians)],
+                            [-sin(angle_radians), cos(angle_radians)]])
+    return numpy.dot(pts - cnt, rotation) + cnt
 
 def get_max_x(points):
     assert len(points) > 0
@@ -117,6 +170,31 @@ def dist(point1, point2):
     """
     return sqrt( (point2[1] - point1[1]) ** 2 + (point2[0] - point1[0]) ** 2 )
 
+def path_length(path):
+    """
+        Returns the total distance travelled along *path*
+    """
+    points = numpy.asarray(path, dtype=float).reshape(-1, 2)
+    legs = numpy.diff(points, axis=0)
+    return float(numpy.hypot(legs[:, 0], legs[:, 1]).sum())
+
+def count_turns(path):
+    """
+        Returns the number of points on *path* where the direction of travel
+        changes. Repeated points and points in the middle of a straight line
+        are not turns.
+    """
+    points = numpy.asarray(path, dtype=float).reshape(-1, 2)
+    legs = numpy.diff(points, axis=0)
+    legs = legs[(legs != 0).any(axis=1)]
+    cross = legs[:-1, 0] * legs[1:, 1] - legs[:-1, 1] * legs[1:, 0]
+    dot = (legs[:-1] * legs[1:]).sum(axis=1)
+    scale = numpy.hypot(legs[:-1, 0], legs[:-1, 1]) * \
+            numpy.hypot(legs[1:, 0], legs[1:, 1])
+    # Straight ahead if parallel (up to rounding) and pointing the same way
+    straight = (numpy.abs(cross) <= 1e-9 * scale) & (dot > 0)
+    return int((~straight).sum())
+
 def to_line_segments(points):
     """
         Returns an list of line_segments generated from an list of points
@@ -190,20 +268,369 @@ def partition_line_segment_if_vertical(line_segment, distance):
             distance)] + [stop]
         return result
 
-def calculate_line_segments(boundaries, dx, overshoot_distance):
+def normalize_and_pad(path, boundaries, size, border):
+    """
+        Takes the path and boundaries, and converts them into pixel
+        coordinates, for an image of *size* plus a border of *border*
+        pixels on every side. Returns them as (N, 2) arrays.
+    """
+    path = numpy.asarray(path, dtype = float).reshape(-1, 2)
+    boundaries = numpy.asarray(boundaries, dtype = float).reshape(-1, 2)
+    smallest, largest = numpy.array(get_bounding_box(numpy.vstack([boundaries, path])))
+    scale = numpy.asarray(size, dtype = float) / (largest - smallest)
+
+    def normalize_points(points):
+        return (points - smallest) * scale + border
+
+    return normalize_points(path), normalize_points(boundaries)
+
+def _arange_values(start, step, indices):
+    """
+        Returns the values at *indices* of numpy.arange(start, stop, step),
+        exactly as numpy.arange computes them, without the rest of the range
+    """
+    delta = (start + step) - start
+    return numpy.where(indices == 1, start + step, start + indices * delta)
+
+def densify_vertical_legs(path, distance):
+    """
+        Batched equivalent of partition_line_segment_if_vertical over every
+        leg of *path*, filling a single array. Each vertical leg is split into
+        pieces with maximum length *distance*; any other leg keeps just its two
+        points. Returns the waypoints of all legs, one leg after another, as a
+        Path, and the index of the last waypoint of each leg.
+    """
+    assert distance > 0
+    legs = Path(path).get_legs()
+    (start_x, start_y), (stop_x, stop_y) = legs[:, 0].T, legs[:, 1].T
+    vertical = start_x == stop_x
+    steps = numpy.where(start_y > stop_y, -distance, distance)
+
+    # Each leg has its stop point, after as many points as numpy.arange
+    # gives from its start point, or just the start point if not vertical
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        counts = numpy.where(vertical, numpy.ceil((stop_y - start_y) / steps), 1)
+    counts = counts.astype(int)
+    leg_ends = numpy.cumsum(counts + 1) - 1
+
+    waypoints = numpy.empty((counts.sum() + len(legs), 2))
+    waypoints[leg_ends] = legs[:, 1]
+
+    # The k-th point from the start of a leg, computed as numpy.arange does
+    leg_ids = numpy.repeat(numpy.arange(len(legs)), counts)
+    k = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts,
+                                                  counts)
+    rows = numpy.repeat(leg_ends - counts, counts) + k
+    waypoints[rows, 0] = start_x[leg_ids]
+    waypoints[rows, 1] = _arange_values(start_y[leg_ids], steps[leg_ids], k)
+    return Path(waypoints), leg_ends
+
+def get_boundary_edges(boundaries):
+    """
+        Returns the edges of the closed polygon *boundaries* as two (N, 2)
+        arrays holding the start and stop point of each edge
+    """
+    starts = numpy.asarray(boundaries, dtype=float).reshape(-1, 2)
+    return starts, numpy.roll(starts, -1, axis=0)
+
+def calculate_scanline_crossings(xs, boundaries):
+    """
+        Batched equivalent of calculate_intersections for every vertical line
+        x=xs[i] that spans the boundaries. Returns two arrays: the index into
+        *xs* of the line, and the y value of the crossing, sorted by line and
+        then by y. A vertex hit is reported once, and an edge that lies on the
+        line reports both of its end points, as shapely does.
+    """
+    xs = numpy.asarray(xs, dtype=float)
+    starts, stops = get_boundary_edges(boundaries)
+    line_ids, edge_ids = _pair_lines_with_edges(xs, starts, stops, "right")
+
+    x = xs[line_ids]
+    (x1, y1), (x2, y2) = starts[edge_ids].T, stops[edge_ids].T
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        y = y1 + (x - x1) * (y2 - y1) / (x2 - x1)
+    # Snap vertex hits so that both edges sharing a vertex agree on it
+    y = numpy.where(x == x2, y2, y)
+    y = numpy.where(x == x1, y1, y)
+
+    # Edges lying on a line intersect it as line strings, and keep both of
+    # their end points even when they share one with a neighbouring edge
+    overlapping = (x1 == x2) & (y1 != y2)
+    line_ids = numpy.concatenate([line_ids[overlapping], line_ids[overlapping],
+                                  line_ids[~overlapping]])
+    y = numpy.concatenate([y1[overlapping], y2[overlapping], y[~overlapping]])
+    is_point = numpy.arange(len(y)) >= 2 * overlapping.sum()
+
+    # Sort line string end points ahead of points at the same location, so
+    # that a point is dropped if anything was already reported there
+    order = numpy.lexsort((is_point, y, line_ids))
+    line_ids, y, is_point = line_ids[order], y[order], is_point[order]
+    keep = numpy.ones(len(y), dtype=bool)
+    keep[1:] = ~is_point[1:] | (line_ids[1:] != line_ids[:-1]) | \
+               (y[1:] != y[:-1])
+    return line_ids[keep], y[keep]
+
+def _pair_lines_with_edges(xs, starts, stops, side):
+    """
+        Returns the (line, edge) pairs of every vertical line x=xs[i] and
+        every edge from starts[j] to stops[j] that it crosses, as two arrays
+        of indices. A line at the largest x of an edge only crosses it if
+        *side* is "right".
+    """
+    # Every edge crosses a contiguous run of the sorted lines, so the
+    # (line, edge) pairs can be enumerated without testing every combination
+    line_order = numpy.argsort(xs, kind="mergesort")
+    sorted_xs = xs[line_order]
+    first = numpy.searchsorted(sorted_xs,
+            numpy.minimum(starts[:, 0], stops[:, 0]), side="left")
+    last = numpy.searchsorted(sorted_xs,
+            numpy.maximum(starts[:, 0], stops[:, 0]), side=side)
+    counts = last - first
+
+    edge_ids = numpy.repeat(numpy.arange(len(starts)), counts)
+    run_offsets = numpy.arange(counts.sum()) - \
+                  numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    line_ids = line_order[numpy.repeat(first, counts) + run_offsets]
+    return line_ids, edge_ids
+
+def calculate_ring_intervals(xs, rings):
+    """
+        Returns the intervals of every vertical line x=xs[i] that lie inside
+        any of the closed polygons *rings*, as three arrays: the index into
+        *xs* of the line, and the bottom and top of the interval, sorted by
+        line. Each ring is filled by the even-odd rule on its own, so the
+        intervals of overlapping rings overlap.
+
+        A line only crosses an edge if it is at or right of the edge's
+        smallest x and left of its largest x, so that every line crosses
+        every ring an even number of times, even through a vertex.
+    """
+    xs = numpy.asarray(xs, dtype=float)
+    rings = [numpy.asarray(ring, dtype=float).reshape(-1, 2) for ring in rings]
+    if not rings:
+        return numpy.zeros(0, dtype=int), numpy.zeros(0), numpy.zeros(0)
+
+    edges = [get_boundary_edges(ring) for ring in rings]
+    starts = numpy.concatenate([ring_starts for ring_starts, ring_stops in edges])
+    stops = numpy.concatenate([ring_stops for ring_starts, ring_stops in edges])
+    ring_ids = numpy.repeat(numpy.arange(len(rings)), [len(ring) for ring in rings])
+    line_ids, edge_ids = _pair_lines_with_edges(xs, starts, stops, "left")
+
+    # Vertical edges are never crossed, so x1 != x2
+    x = xs[line_ids]
+    (x1, y1), (x2, y2) = starts[edge_ids].T, stops[edge_ids].T
+    y = y1 + (x - x1) * (y2 - y1) / (x2 - x1)
+
+    # Each line crosses each ring an even number of times, so consecutive
+    # crossings pair up into intervals
+    order = numpy.lexsort((y, ring_ids[edge_ids], line_ids))
+    line_ids, y = line_ids[order], y[order]
+    return line_ids[0::2], y[0::2], y[1::2]
+
+def subtract_intervals(intervals, other_intervals):
+    """
+        Returns the parts of *intervals* that are not inside any of
+        *other_intervals* on the same line. Both are given, and the result
+        is returned, as (line_ids, bottoms, tops) arrays, like
+        calculate_scanline_segments returns; the intervals must not overlap
+        each other, but the other intervals may. An interval of length zero
+        is kept if it isn't inside another interval.
+    """
+    line_ids, bottoms, tops = intervals
+    other_line_ids, other_bottoms, other_tops = other_intervals
+    n, m = len(line_ids), len(other_line_ids)
+
+    # Sweep each line from the bottom, keeping count of the intervals and
+    # the other intervals that the sweep is inside. Where they meet, other
+    # intervals end first and start next, then intervals start and end.
+    lines = numpy.concatenate([line_ids, line_ids, other_line_ids, other_line_ids])
+    ys = numpy.concatenate([bottoms, tops, other_bottoms, other_tops])
+    priority = numpy.repeat([2, 3, 1, 0], [n, n, m, m])
+    order = numpy.lexsort((priority, ys, lines))
+    lines, ys, priority = lines[order], ys[order], priority[order]
+
+    inside = numpy.cumsum(numpy.array([0, 0, 1, -1])[priority]) > 0
+    outside_others = numpy.cumsum(numpy.array([-1, 1, 0, 0])[priority]) == 0
+    kept = inside & outside_others
+    was_kept = numpy.r_[False, kept[:-1]]
+    starts = numpy.flatnonzero(kept & ~was_kept)
+    stops = numpy.flatnonzero(was_kept & ~kept)
+
+    # Where other intervals only touch, they leave a gap of length zero
+    # that isn't worth flying
+    keep = (ys[stops] > ys[starts]) | (priority[starts] == 2)
+    starts, stops = starts[keep], stops[keep]
+    return lines[starts], ys[starts], ys[stops]
+
+def _nearest_below(line_ids, ys, other_line_ids, other_ys):
+    """
+        Returns, for each of *ys*, the largest of *other_ys* on the same
+        line that is no greater than it, or -inf if there is none
+    """
+    n, m = len(line_ids), len(other_line_ids)
+    lines = numpy.concatenate([other_line_ids, line_ids])
+    values = numpy.concatenate([other_ys, ys])
+    is_other = numpy.arange(n + m) < m
+    order = numpy.lexsort((~is_other, values, lines))
+
+    # The nearest other value is the last one sorted ahead of each value
+    last_other = numpy.maximum.accumulate(
+            numpy.where(is_other[order], numpy.arange(n + m), -1))
+    positions = numpy.empty(n + m, dtype=int)
+    positions[order] = numpy.arange(n + m)
+    found = last_other[positions[m:]]
+    valid = found >= 0
+    valid[valid] = lines[order][found[valid]] == line_ids[valid]
+
+    result = numpy.empty(n)
+    result.fill(-numpy.inf)
+    result[valid] = values[order][found[valid]]
+    return result
+
+def calculate_scanline_segments(xs, boundaries):
+    """
+        Batched equivalent of calculate_line_segments_thru for every x in
+        *xs*. Returns three arrays: the index into *xs* of each line segment,
+        and the y values of its bottom and top points. Line segments are
+        sorted by line and then by y.
+    """
+    line_ids, y = calculate_scanline_crossings(xs, boundaries)
+
+    line_starts = numpy.searchsorted(line_ids, line_ids, side="left")
+    line_stops = numpy.searchsorted(line_ids, line_ids, side="right")
+    rank = numpy.arange(len(y)) - line_starts
+    crossings = line_stops - line_starts
+
+    # Pair up the sorted crossings of each line; if a line only touches the
+    # boundaries at a single point, a line segment with length zero is kept
+    # there so that the point is still visited
+    is_bottom = ((rank % 2 == 0) & (rank + 1 < crossings)) | (crossings == 1)
+    bottoms = numpy.flatnonzero(is_bottom)
+    tops = numpy.where(crossings[bottoms] == 1, bottoms, bottoms + 1)
+    return line_ids[bottoms], y[bottoms], y[tops]
+
+def calculate_line_segments(boundaries, dx, overshoot_distance, offset = 0,
+                            holes = (), no_fly_zones = ()):
     """
         Returns the line_segments that the plane must traverse to search
-        *boundaries*
+        *boundaries*, as an (M, 2, 2) array. The first line is *offset* to
+        the right of the leftmost point of the boundaries.
+
+        The parts of the lines inside the polygons *holes* and *no_fly_zones*
+        are left out, and the line segments are only padded as far as the
+        nearest no-fly zone.
     """
 
-    def pad(line_segment):
-        return pad_vertical(line_segment, overshoot_distance)
+    start_x = get_min_x(boundaries) + offset
+    stop_x = get_max_x(boundaries)
+    xs = numpy.arange(start_x, stop_x, dx)
+    return _calculate_line_segments_at(xs, boundaries, overshoot_distance,
+                                       holes, no_fly_zones)
 
-    start_x = get_min_x(boundaries)
+def iter_line_segment_bands(boundaries, dx, overshoot_distance, offset = 0,
+                            band_size = 64, holes = (), no_fly_zones = ()):
+    """
+        Generator equivalent of calculate_line_segments, which yields the
+        line segments of *band_size* lines at a time, so that only one band
+        of them is ever in memory. Concatenated, the bands are exactly the
+        line segments that calculate_line_segments returns.
+    """
+    assert band_size > 0
+    start_x = get_min_x(boundaries) + offset
     stop_x = get_max_x(boundaries)
-    line_segments_list = [calculate_line_segments_thru(x, boundaries)\
-                          for x in numpy.arange(start_x,stop_x,dx)]
+    count = max(int(numpy.ceil((stop_x - start_x) / float(dx))), 0)
+    for first in xrange(0, count, band_size):
+        indices = numpy.arange(first, min(first + band_size, count))
+        xs = _arange_values(start_x, dx, indices)
+        yield _calculate_line_segments_at(xs, boundaries, overshoot_distance,
+                                          holes, no_fly_zones)
+
+def _calculate_clipped_scanline_segments(xs, boundaries, holes, no_fly_zones):
+    """
+        Returns calculate_scanline_segments of *xs* and *boundaries* without
+        the parts inside *holes* and *no_fly_zones*, and the intervals of
+        the lines inside the no-fly zones
+    """
+    segments = calculate_scanline_segments(xs, boundaries)
+    zone_intervals = calculate_ring_intervals(xs, no_fly_zones)
+    if len(holes) or len(no_fly_zones):
+        hole_intervals = calculate_ring_intervals(xs, holes)
+        segments = subtract_intervals(segments, [numpy.concatenate(arrays) for
+                arrays in zip(hole_intervals, zone_intervals)])
+    return segments, zone_intervals
+
+def _calculate_line_segments_at(xs, boundaries, overshoot_distance, holes = (),
+                                no_fly_zones = ()):
+    """
+        Returns the padded line segments along the lines x = each of *xs*
+    """
+    (line_ids, bottoms, tops), (zone_line_ids, zone_bottoms, zone_tops) = \
+            _calculate_clipped_scanline_segments(xs, boundaries, holes, no_fly_zones)
+
+    # Padding stops at the nearest no-fly zone above or below
+    bottom_padding, top_padding = overshoot_distance, overshoot_distance
+    if len(zone_line_ids):
+        bottom_padding = numpy.minimum(overshoot_distance, bottoms -
+                _nearest_below(line_ids, bottoms, zone_line_ids, zone_tops))
+        top_padding = numpy.minimum(overshoot_distance, -tops -
+                _nearest_below(line_ids, -tops, zone_line_ids, -zone_bottoms))
+
+    # Each line segment runs from bottom to top, so padding it as
+    # pad_vertical would moves the bottom down and the top up
+    line_segments = numpy.empty((len(line_ids), 2, 2))
+    line_segments[:, :, 0] = xs[line_ids, None]
+    line_segments[:, 0, 1] = bottoms - bottom_padding
+    line_segments[:, 1, 1] = tops + top_padding
+    return line_segments
+
+def optimize_scanline_offset(boundaries, dx, overshoot_distance,
+                             criterion = "segments", samples = 32, holes = (),
+                             no_fly_zones = (), band_size = 64):
+    """
+        Returns the offset in [0, *dx*) to pass to calculate_line_segments
+        that gives the fewest line segments (*criterion* "segments") or the
+        shortest total length of line segments, including their padding
+        (*criterion* "length"). Each criterion breaks ties with the other,
+        then with the smaller offset. *samples* evenly spaced offsets are
+        tried, batched *band_size* lines of each at a time, so that only
+        one band of lines is in memory as in iter_line_segment_bands. The
+        line segments are clipped by *holes* and *no_fly_zones* as for
+        calculate_line_segments, but counted with their full padding.
+    """
+    assert samples > 0 and band_size > 0
+    if criterion not in ("segments", "length"):
+        raise ValueError("Unknown criterion: %s" % criterion)
 
-    # Flatten
-    return [pad(line_segment) for line_segments in line_segments_list \
-            for line_segment in line_segments]
+    start_x = get_min_x(boundaries)
+    stop_x = get_max_x(boundaries)
+    offsets = numpy.arange(samples) * (float(dx) / samples)
+    starts = start_x + offsets
+    line_counts = numpy.maximum(numpy.ceil((stop_x - starts) / float(dx)), 0).astype(int)
+
+    counts = numpy.zeros(samples, dtype=int)
+    lengths = numpy.zeros(samples)
+    for first in xrange(0, line_counts.max(), band_size):
+        columns = [_arange_values(start, dx, numpy.arange(first,
+                   min(first + band_size, line_count)))
+                   for start, line_count in zip(starts, line_counts)]
+        xs = numpy.concatenate(columns)
+        samples_of_xs = numpy.repeat(numpy.arange(samples),
+                                     [len(column) for column in columns])
+
+        line_ids, bottoms, tops = _calculate_clipped_scanline_segments(xs,
+                boundaries, holes, no_fly_zones)[0]
+        sample_ids = samples_of_xs[line_ids]
+        counts += numpy.bincount(sample_ids, minlength=samples)
+        lengths += numpy.bincount(sample_ids, weights=numpy.abs(tops - bottoms +
+                                  2 * overshoot_distance), minlength=samples)
+
+    # Lengths that only differ by rounding, which depends on how the lines
+    # were batched, are ties
+    if lengths.max() > 0:
+        lengths = numpy.round(lengths / lengths.max(), 9)
+
+    if criterion == "segments":
+        best = numpy.lexsort((offsets, lengths, counts))[0]
+    else:
+        best = numpy.lexsort((offsets, counts, lengths))[0]
+    return float(offsets[best])
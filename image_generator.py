@@ -1,13 +1,60 @@
+import numpy
 import geometry_operations
-from geometry_operations import get_bounding_box
+from geometry_operations import get_bounding_box, normalize_and_pad
 from PIL import Image, ImageDraw, ImageFont
 
+# Fonts loaded so far, by file name and size. Loading a TrueType font is
+# slow, so each one is only loaded once.
+_fonts = {}
+
+def get_font(filename, size):
+    if (filename, size) not in _fonts:
+        _fonts[filename, size] = ImageFont.truetype(filename, size)
+    return _fonts[filename, size]
+
+def place_labels(positions, label_sizes):
+    """
+        Chooses which labels to draw so that none overlap. Label i has its
+        top left corner at *positions*[i] and has size *label_sizes*[i].
+        Labels are taken in order, and skipped if they would overlap one
+        already taken. Returns the indices of the labels taken.
+
+        Taken labels are kept in a grid of cells as large as the largest
+        label, so each label is only checked against those nearby.
+    """
+    positions = numpy.asarray(positions, dtype = float).reshape(-1, 2)
+    label_sizes = numpy.asarray(label_sizes, dtype = float).reshape(-1, 2)
+    if not len(positions):
+        return []
+
+    cell_size = numpy.maximum(label_sizes.max(axis = 0), 1)
+    cells = numpy.floor(positions / cell_size).astype(int)
+    grid = {}
+    taken = []
+
+    for index, ((x, y), (width, height), (column, row)) in \
+            enumerate(zip(positions, label_sizes, cells)):
+        def overlaps(other):
+            (other_x, other_y), (other_width, other_height) = \
+                    positions[other], label_sizes[other]
+            return x < other_x + other_width and other_x < x + width and \
+                   y < other_y + other_height and other_y < y + height
+
+        neighbours = (other for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                      for other in grid.get((column + dx, row + dy), ()))
+        if not any(overlaps(other) for other in neighbours):
+            grid.setdefault((column, row), []).append(index)
+            taken.append(index)
+
+    return taken
+
 class ImageGenerator:
     """
         Generates an image of a path and search area
     """
     BORDER_PX = 50
     FONT_SIZE = 54
+    FONT = 'arial.ttf'
     def __init__(self, pathfinder):
         self.pathfinder = pathfinder
 
@@ -19,69 +66,41 @@ class ImageGenerator:
         """
         return x + 2*ImageGenerator.BORDER_PX, y + 2*ImageGenerator.BORDER_PX
 
-    @staticmethod
-    def __pad_points(points, padding):
-        """
-            Returns a new set of points with *padding* added to the x
-            and y component of each point
-        """
-        def pad_point(point, padding):
-            x, y = point
-            return (x + padding, y + padding)
-
-        return [pad_point(point, padding) for point in points]
-
     @staticmethod
     def __render_image_normalized(path, boundaries, size):
         """
             Creates an image using path and boundaries that are already index
-            the pixel coordinate system
+            the pixel coordinate system. The path is drawn as one polyline,
+            and each waypoint but the last is numbered, leaving out the
+            numbers that would overlap others.
         """
         image = Image.new("RGB", size, '#FFFFFF')
         draw = ImageDraw.Draw(image)
 
-        draw.polygon(boundaries, '#999999')
-        font = ImageFont.truetype('arial.ttf', ImageGenerator.FONT_SIZE)
-
-        for index, segment in enumerate(geometry_operations.to_line_segments(path)[:-1]):
-            draw.line(segment, '#000000')
-            draw.text(segment[0], str(index+1), fill='#FF0000', font=font)
+        draw.polygon([tuple(point) for point in boundaries], '#999999')
+        if len(path) > 1:
+            draw.line([tuple(point) for point in path], '#000000')
+
+        # The labels are numbers, and digits all have the same width, so
+        # labels with as many digits have the same size
+        font = get_font(ImageGenerator.FONT, ImageGenerator.FONT_SIZE)
+        labels = [str(index + 1) for index in range(len(path) - 1)]
+        sizes_by_digits = {}
+        for label in labels:
+            if len(label) not in sizes_by_digits:
+                sizes_by_digits[len(label)] = font.getsize("0" * len(label))
+        label_sizes = [sizes_by_digits[len(label)] for label in labels]
+        for index in place_labels(path[:-1], label_sizes):
+            draw.text(tuple(path[index]), labels[index], fill='#FF0000', font=font)
 
         return image
 
-    @staticmethod
-    def __normalize_and_pad(path, boundaries, size):
-        """
-            Takes the path and boundaries, and converts them into pixel
-            coordinates. Also adds the padding for the border
-        """
-        (smallest_x, smallest_y), (largest_x, largest_y) = \
-        geometry_operations.get_bounding_box(boundaries + path)
-
-        dx = largest_x - smallest_x
-        dy = largest_y - smallest_y
-        x_pixels, y_pixels = size
-
-        def normalize_points(points):
-            def normalize_point(point):
-                x = float(point[0] - smallest_x)
-                y = float(point[1] - smallest_y)
-                return ((x/dx) * x_pixels, (y/dy) * y_pixels)
-
-            return [normalize_point(point) for point in points]
-
-        path = normalize_points(path)
-        boundaries = normalize_points(boundaries)
-
-        return ImageGenerator.__pad_points(path, ImageGenerator.BORDER_PX), \
-               ImageGenerator.__pad_points(boundaries, ImageGenerator.BORDER_PX)
-
     def create_image(self, filename, size = None):
 
         def get_base_size():
             if size:
                 return size
-            else: 
+            else:
                 image_x = 1024
                 image_y = int(1024 * geometry_operations.compute_ratio(
                     get_bounding_box(self.pathfinder.boundaries)))
@@ -91,7 +110,7 @@ class ImageGenerator:
             image_x, image_y = get_base_size()
             return ImageGenerator.__pad_dimensions(image_x, image_y)
 
-        path, boundaries = ImageGenerator.__normalize_and_pad(self.pathfinder.get_path(),
-                self.pathfinder.boundaries, get_base_size())
+        path, boundaries = normalize_and_pad(self.pathfinder.get_path(),
+                self.pathfinder.boundaries, get_base_size(), ImageGenerator.BORDER_PX)
         image = ImageGenerator.__render_image_normalized(path, boundaries, get_padded_size())
         image.save(filename, 'jpeg')
@@ -1,111 +1,205 @@
+import sys
+import tempfile
+import zipfile
+from StringIO import StringIO
+
+import numpy
+import shapely.geometry
+
+# How many bytes of spooled markers are copied to the output at a time
+SPOOL_BLOCK_SIZE = 1 << 16
+
 class KMLGenerator:
     """
 	Outputs the path waypoints to a format that can be displayed by
 	Google Earth.
     """
+    MARKERS = ("multigeometry", "placemarks", None)
 
     def __init__(self, pathfinder):
 	self.pathfinder = pathfinder
 
-    def export_kml(self):
-	def print_header():
-	    print '<?xml version="1.0" encoding="UTF-8"?>'
-	    print '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2" xmlns:atom="http://www.w3.org/2005/Atom">'
-	    print '<Folder>'
-		
-	def print_boundaries():
-	    print '<Style id="boundarystyle">'
-	    print '\t<PolyStyle>'
-	    print '\t\t<color>8000ff00</color>'
-	    print '\t</PolyStyle>'
-	    print '\t</Style>'
-	    print '<Placemark>'
-	    print '\t<name>Flight Boundaries</name>'
-	    print '\t<styleUrl>#boundarystyle</styleUrl>'
-	    print '\t<Polygon>'
-	    print '\t\t<extrude>1</extrude>'
-	    print '\t\t<altitudeMode>clampToGround</altitudeMode>'
-	    print '\t\t<outerBoundaryIs>'
-	    print '\t\t\t<LinearRing>'
-	    print '\t\t\t\t<coordinates>'
-	    for index, (x,y) in enumerate(self.pathfinder.get_boundaries()):
-		lat = "%.6f"%x
-		lng = "%.6f"%y
-
-		print '\t\t\t\t\t%s,%s,%s'%(lng, lat, "0.0")
-
-	    print '\t\t\t\t</coordinates>'
-	    print '\t\t\t</LinearRing>'
-	    print '\t\t</outerBoundaryIs>'
-	    print '\t</Polygon>'
-	    print '</Placemark>'
-
-	def print_searcharea():
-	    print '<Style id="searchareastyle">'
-	    print '\t<PolyStyle>'
-	    print '\t\t<color>ccff0000</color>'
-	    print '\t</PolyStyle>'
-	    print '\t</Style>'
-	    print '<Placemark>'
-	    print '\t<name>Search Area</name>'
-	    print '\t<styleUrl>#searchareastyle</styleUrl>'
-	    print '\t<Polygon>'
-	    print '\t\t<color>ccff0000</color>'
-	    print '\t\t<extrude>1</extrude>'
-	    print '\t\t<altitudeMode>clampToGround</altitudeMode>'
-	    print '\t\t<outerBoundaryIs>'
-	    print '\t\t\t<LinearRing>'
-	    print '\t\t\t\t<coordinates>'
-	    for index, (x,y) in enumerate(self.pathfinder.get_searcharea()):
-		lat = "%.6f"%x
-		lng = "%.6f"%y
-
-		print '\t\t\t\t\t%s,%s,%s'%(lng, lat, "0.0")
-
-	    print '\t\t\t\t</coordinates>'
-	    print '\t\t\t</LinearRing>'
-	    print '\t\t</outerBoundaryIs>'
-	    print '\t</Polygon>'
-	    print '</Placemark>'
-
-	def print_path():
-	    print '<Placemark>'
-	    print '\t<name>Flight Path</name>'
-	    print '\t<LineString>'
-	    print '\t<extrude>1</extrude>'
-	    print '\t<tesselate>1</tesselate>'
-	    print '\t<coordinates>'
-	    for index, (x, y) in enumerate(self.pathfinder.get_path()):
-		lat = "%.6f"%x
-		lng = "%.6f"%y
-		alt = str(self.pathfinder.get_altitude())
-
-		print '\t\t%s,%s,%s'%(lng, lat, alt)
-
-	    print '\t</coordinates>'
-	    print '\t</LineString>'
-	    print '</Placemark>'
-
-	def print_points():
-	    for index, (x, y) in enumerate(self.pathfinder.get_path()):
-		lat = "%.6f"%x
-		lng = "%.6f"%y
-		alt = str(self.pathfinder.get_altitude())
-
-		print '<Placemark>'
-		print '\t<name>WP %i</name>'%index
-		print '\t<Point>'
-		print '\t\t<coordinates>%s,%s,%s</coordinates>'%(lng, lat, alt)
-		print '\t</Point>'
-		print '\t</Placemark>'
-
-	def print_footer():
-	    print '</Folder>'
-	    print '</kml>'
-
-	print_header()
-	print_searcharea()
-	print_boundaries()
-	print_path()
-	print_points()
-	print_footer()
+    def get_waypoint_chunks(self, streaming = False):
+	"""
+	    Returns the waypoints to export, as a list of one Path. If
+	    *streaming*, returns a generator that plans them chunk by chunk
+	    as they are written instead, see Pathfinder.iter_path_chunks
+	"""
+	if streaming:
+	    return self.pathfinder.iter_path_chunks()
+	return [self.pathfinder.get_path()]
+
+    def export_kml(self, output = None, streaming = False, tolerance = 0,
+		   marker_spacing = 1, markers = "multigeometry", kmz = None):
+	"""
+	    Writes the search area, the flight boundaries and the path as
+	    KML to *output*, which is a file-like object or the name of a
+	    file, or STDOUT if None. The path is read once, chunk by chunk if
+	    *streaming*, and written as it is read. The markers, which come
+	    after the path line, are spooled to a temporary file meanwhile.
+
+	    The level of detail is set by:
+		tolerance:
+		    The path line is simplified so that it strays no more
+		    than *tolerance* from the path. 0 keeps every waypoint.
+		marker_spacing:
+		    Only every *marker_spacing*-th waypoint gets a marker.
+		    The last waypoint always gets one.
+		markers:
+		    "multigeometry" puts all markers in a single Placemark,
+		    "placemarks" gives each its own Placemark with its
+		    number, and None leaves them out.
+
+	    If *kmz*, the KML is zipped into a KMZ file, which is built in
+	    memory first. By default, a KMZ is written if *output* is a file
+	    name ending in ".kmz".
+	"""
+	if markers not in KMLGenerator.MARKERS:
+	    raise ValueError("Unknown markers: %s" % markers)
+	assert marker_spacing > 0
+
+	altitude = str(self.pathfinder.get_altitude())
+	# Coordinates are given as longitude, latitude, altitude
+	def format_coordinates(points, line_format):
+	    points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+	    values = tuple(points[:, ::-1].ravel().tolist())
+	    return (line_format * len(points)) % values
+
+	def write_polygon(write, name, style, color, points, polygon_color = False):
+	    write('<Style id="%s">\n'
+		  '\t<PolyStyle>\n'
+		  '\t\t<color>%s</color>\n'
+		  '\t</PolyStyle>\n'
+		  '\t</Style>\n'
+		  '<Placemark>\n'
+		  '\t<name>%s</name>\n'
+		  '\t<styleUrl>#%s</styleUrl>\n'
+		  '\t<Polygon>\n' % (style, color, name, style) +
+		  ('\t\t<color>%s</color>\n' % color if polygon_color else '') +
+		  '\t\t<extrude>1</extrude>\n'
+		  '\t\t<altitudeMode>clampToGround</altitudeMode>\n'
+		  '\t\t<outerBoundaryIs>\n'
+		  '\t\t\t<LinearRing>\n'
+		  '\t\t\t\t<coordinates>\n' +
+		  format_coordinates(points, '\t\t\t\t\t%.6f,%.6f,0.0\n') +
+		  '\t\t\t\t</coordinates>\n'
+		  '\t\t\t</LinearRing>\n'
+		  '\t\t</outerBoundaryIs>\n'
+		  '\t</Polygon>\n'
+		  '</Placemark>\n')
+
+	def simplify(points):
+	    if tolerance <= 0 or len(points) < 3:
+		return points
+	    line = shapely.geometry.LineString(points)
+	    return numpy.array(line.simplify(tolerance, preserve_topology = False).coords)
+
+	def format_markers(points, indices):
+	    if markers == "multigeometry":
+		return format_coordinates(points, '\t\t<Point><coordinates>'
+			'%.6f,%.6f,' + altitude + '</coordinates></Point>\n')
+	    values = numpy.empty((len(points), 3))
+	    values[:, 0] = indices
+	    values[:, 1:] = numpy.asarray(points, dtype = float).reshape(-1, 2)[:, ::-1]
+	    placemark = ('<Placemark>\n'
+			 '\t<name>WP %i</name>\n'
+			 '\t<Point>\n'
+			 '\t\t<coordinates>%.6f,%.6f,' + altitude +
+			 '</coordinates>\n'
+			 '\t</Point>\n'
+			 '\t</Placemark>\n')
+	    return (placemark * len(points)) % tuple(values.ravel().tolist())
+
+	def write_path(write, write_markers):
+	    """
+		Writes the path line, and passes the waypoints that get
+		markers and their numbers to *write_markers*, chunk by chunk
+	    """
+	    write('<Placemark>\n'
+		  '\t<name>Flight Path</name>\n'
+		  '\t<LineString>\n'
+		  '\t<extrude>1</extrude>\n'
+		  '\t<tesselate>1</tesselate>\n'
+		  '\t<coordinates>\n')
+
+	    first_index = 0
+	    last_point = None
+	    for chunk in self.get_waypoint_chunks(streaming):
+		chunk = numpy.asarray(chunk, dtype = float).reshape(-1, 2)
+		indices = numpy.arange(first_index, first_index + len(chunk))
+		is_marked = indices % marker_spacing == 0
+		write_markers(chunk[is_marked], indices[is_marked])
+
+		# Each chunk continues from the last point of the one before,
+		# which must stay in the simplified line
+		if last_point is None:
+		    line = simplify(chunk)
+		else:
+		    line = simplify(numpy.vstack([last_point, chunk]))[1:]
+		write(format_coordinates(line, '\t\t%.6f,%.6f,' + altitude + '\n'))
+
+		first_index += len(chunk)
+		if len(chunk):
+		    last_point = chunk[-1]
+
+	    write('\t</coordinates>\n'
+		  '\t</LineString>\n'
+		  '</Placemark>\n')
+
+	    if first_index and (first_index - 1) % marker_spacing:
+		write_markers([last_point], [first_index - 1])
+
+	def write_path_and_markers(write):
+	    """
+		Writes the path line, then its markers. The markers are
+		spooled to a temporary file while the path is read, so that
+		neither is held in memory.
+	    """
+	    if markers is None:
+		write_path(write, lambda points, indices: None)
+		return
+
+	    spool = tempfile.TemporaryFile()
+	    try:
+		write_path(write, lambda points, indices:
+			   spool.write(format_markers(points, indices)))
+		spool.seek(0)
+		if markers == "multigeometry":
+		    write('<Placemark>\n'
+			  '\t<name>Waypoints</name>\n'
+			  '\t<MultiGeometry>\n')
+		for block in iter(lambda: spool.read(SPOOL_BLOCK_SIZE), ''):
+		    write(block)
+		if markers == "multigeometry":
+		    write('\t</MultiGeometry>\n'
+			  '</Placemark>\n')
+	    finally:
+		spool.close()
+
+	def write_kml(write):
+	    write('<?xml version="1.0" encoding="UTF-8"?>\n'
+		  '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2" xmlns:atom="http://www.w3.org/2005/Atom">\n'
+		  '<Folder>\n')
+	    write_polygon(write, "Search Area", "searchareastyle", "ccff0000",
+			  self.pathfinder.get_searcharea(), polygon_color = True)
+	    write_polygon(write, "Flight Boundaries", "boundarystyle", "8000ff00",
+			  self.pathfinder.get_boundaries())
+	    write_path_and_markers(write)
+	    write('</Folder>\n'
+		  '</kml>\n')
+
+	if output is None:
+	    output = sys.stdout
+	if kmz is None:
+	    kmz = isinstance(output, basestring) and output.endswith(".kmz")
+
+	if kmz:
+	    document = StringIO()
+	    write_kml(document.write)
+	    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+		archive.writestr("doc.kml", document.getvalue())
+	elif isinstance(output, basestring):
+	    with open(output, "w") as output_file:
+		write_kml(output_file.write)
+	else:
+	    write_kml(output.write)
@@ -0,0 +1,94 @@
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from mission_file import Mission, write_mission
+from waypoint_generator import WaypointGenerator
+from kml_generator import KMLGenerator
+from vector_generator import VectorGenerator
+
+def _export_qgc(mission, output, **options):
+    WaypointGenerator(mission).export_qgc_waypoints(output, **options)
+
+def _export_kml(mission, output, **options):
+    KMLGenerator(mission).export_kml(output, **options)
+
+def _export_image(mission, output, **options):
+    # Only rendering an image needs PIL
+    from image_generator import ImageGenerator
+    ImageGenerator(mission).create_image(output, **options)
+
+def _export_svg(mission, output, **options):
+    VectorGenerator(mission).export_svg(output, **options)
+
+def _export_pdf(mission, output, **options):
+    VectorGenerator(mission).export_pdf(output, **options)
+
+def _export_mission(mission, output, **options):
+    write_mission(output, mission, **options)
+
+EXPORTERS = {
+    # QGroundControl waypoint file, see WaypointGenerator
+    "qgc": _export_qgc,
+    # Google Earth KML or KMZ, see KMLGenerator
+    "kml": _export_kml,
+    # JPEG picture of the path, see ImageGenerator
+    "image": _export_image,
+    # SVG or PDF drawing of the path, see VectorGenerator
+    "svg": _export_svg,
+    "pdf": _export_pdf,
+    # Binary mission file, see mission_file
+    "mission": _export_mission
+}
+
+class ExportResult:
+    """
+        The outcome of exporting to one format with export_mission. *name*
+        is the format and *seconds* is how long the export took. On failure,
+        *error* holds the traceback of the exception that was raised;
+        otherwise it is None.
+    """
+
+    def __init__(self, name, seconds, error = None):
+        self.name = name
+        self.seconds = seconds
+        self.error = error
+
+    def succeeded(self):
+        return self.error is None
+
+def export_mission(pathfinder, outputs, options = dict(), threads = None):
+    """
+        Plans the path of *pathfinder* once, then exports it to every format
+        in *outputs* concurrently. *outputs* maps the name of each format
+        (see EXPORTERS) to the file name or file object to write it to, and
+        *options* maps format names to keyword arguments for its exporter.
+        The exports run on a pool of *threads* threads, one per format if
+        None.
+
+        Returns a dict of the ExportResult of each format. A format that
+        fails doesn't stop the others.
+    """
+    for name in list(outputs) + list(options):
+        if name not in EXPORTERS:
+            raise ValueError("Unknown export format: %s" % name)
+
+    mission = Mission.from_pathfinder(pathfinder)
+
+    def export(name):
+        start = time.time()
+        try:
+            EXPORTERS[name](mission, outputs[name], **options.get(name, {}))
+            return ExportResult(name, time.time() - start)
+        except Exception:
+            return ExportResult(name, time.time() - start, traceback.format_exc())
+
+    if not outputs:
+        return {}
+    pool = ThreadPool(threads or len(outputs))
+    try:
+        results = pool.map(export, list(outputs))
+    finally:
+        pool.close()
+        pool.join()
+    return dict((result.name, result) for result in results)
@@ -0,0 +1,189 @@
+import json
+import struct
+from xml.etree import ElementTree
+
+import numpy
+from geometry_operations import Path
+
+# A mission file starts with a fixed size header: the magic string, the
+# version, the length of the JSON header that follows it, the number of
+# waypoints and the offset of the waypoints from the start of the file. The
+# waypoints are stored as an (N, 2) array of little-endian float64.
+MAGIC = "PFMISSN\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+ALIGNMENT = 64
+DTYPE = numpy.dtype("<f8")
+
+KML = "{http://www.opengis.net/kml/2.2}"
+
+class Mission:
+    """
+        A planned mission: its waypoints and the inputs they were planned
+        from. It has the accessors of Pathfinder that WaypointGenerator and
+        KMLGenerator use, so a Mission can be exported to QGC or KML the
+        same way. The waypoints of a loaded mission are memory-mapped from
+        the file, not read into memory.
+    """
+    CHUNK_SIZE = 65536
+
+    def __init__(self, plane_location, searcharea, boundaries, waypoints,
+                 altitude, options = dict()):
+        self.plane_location = tuple(plane_location)
+        self.searcharea = searcharea
+        self.boundaries = boundaries
+        self.waypoints = Path(waypoints)
+        self.altitude = altitude
+        self.options = options
+
+    @staticmethod
+    def from_pathfinder(pathfinder):
+        return Mission(pathfinder.plane_location, pathfinder.get_searcharea(),
+                       pathfinder.get_boundaries(), pathfinder.get_path(),
+                       pathfinder.get_altitude(), pathfinder.get_options())
+
+    def get_path(self):
+        return self.waypoints
+
+    def iter_path_chunks(self):
+        for start in xrange(0, len(self.waypoints), Mission.CHUNK_SIZE):
+            yield self.waypoints[start:start + Mission.CHUNK_SIZE]
+
+    def get_altitude(self):
+        return self.altitude
+
+    def get_options(self):
+        return self.options
+
+    def get_searcharea(self):
+        return self.searcharea
+
+    def get_boundaries(self):
+        return self.boundaries
+
+def _as_list(value):
+    return numpy.asarray(value, dtype = float).tolist()
+
+def write_mission(output, mission, streaming = False):
+    """
+        Writes *mission*, which is a Mission or a Pathfinder, to *output*,
+        which is a file name or a file object open for binary writing. If
+        *streaming*, the waypoints of a Pathfinder are planned and written
+        chunk by chunk (see Pathfinder.iter_path_chunks), and *output* must
+        be seekable.
+    """
+    header = json.dumps({
+        "plane_location": _as_list(mission.plane_location),
+        "searcharea": _as_list(mission.get_searcharea()),
+        "boundaries": _as_list(mission.get_boundaries()),
+        "altitude": float(mission.get_altitude()),
+        "options": mission.get_options()
+    }, sort_keys = True, default = lambda value: value.tolist())
+    data_offset = -(-(HEADER.size + len(header)) // ALIGNMENT) * ALIGNMENT
+    padding = "\0" * (data_offset - HEADER.size - len(header))
+
+    def write_header(output_file, count):
+        output_file.write(HEADER.pack(MAGIC, VERSION, len(header), count,
+                                      data_offset) + header + padding)
+
+    def write_waypoints(output_file, waypoints):
+        waypoints = numpy.ascontiguousarray(waypoints, dtype = DTYPE)
+        output_file.write(waypoints.reshape(-1, 2).data)
+        return len(waypoints)
+
+    def write_to(output_file):
+        if not streaming:
+            path = mission.get_path()
+            write_header(output_file, len(path))
+            write_waypoints(output_file, path)
+            return
+
+        # The number of waypoints is only known once they have all been
+        # written, so the header is written again at the end
+        start = output_file.tell()
+        write_header(output_file, 0)
+        count = 0
+        for chunk in mission.iter_path_chunks():
+            count += write_waypoints(output_file, chunk)
+        end = output_file.tell()
+        output_file.seek(start)
+        write_header(output_file, count)
+        output_file.seek(end)
+
+    if isinstance(output, basestring):
+        with open(output, "wb") as output_file:
+            write_to(output_file)
+    else:
+        write_to(output)
+
+def load_mission(filename):
+    """
+        Loads the mission file *filename*. The waypoints are memory-mapped
+        rather than read, so even very long missions open at once.
+    """
+    with open(filename, "rb") as mission_file:
+        magic, version, header_length, count, data_offset = \
+                HEADER.unpack(mission_file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not a mission file: %s" % filename)
+        if version != VERSION:
+            raise ValueError("Unsupported mission file version: %d" % version)
+        header = json.loads(mission_file.read(header_length))
+
+    if count:
+        waypoints = numpy.memmap(filename, dtype = DTYPE, mode = "r",
+                                 offset = data_offset, shape = (count, 2))
+    else:
+        waypoints = numpy.empty((0, 2))
+    return Mission(header["plane_location"], header["searcharea"],
+                   header["boundaries"], waypoints, header["altitude"],
+                   header["options"])
+
+def read_qgc_waypoints(input_file):
+    """
+        Returns the Mission in the QGC waypoint file *input_file*, a file
+        name or file object, as written by WaypointGenerator. QGC files
+        don't hold the search area or boundaries, so they are left empty.
+    """
+    if isinstance(input_file, basestring):
+        with open(input_file) as opened_file:
+            return read_qgc_waypoints(opened_file)
+
+    if input_file.readline().strip() != "QGC WPL 110":
+        raise ValueError("Not a QGC waypoint file")
+    home = input_file.readline().split("\t")
+    rows = numpy.loadtxt(input_file, delimiter = "\t", usecols = (8, 9, 10),
+                         ndmin = 2)
+    return Mission((float(home[8]), float(home[9])), [], [], rows[:, :2],
+                   float(home[10]))
+
+def read_kml(input_file):
+    """
+        Returns the Mission in the KML file *input_file*, a file name or file
+        object, as written by KMLGenerator. The waypoints are those of the
+        path line, so they are simplified if the KML was. KML doesn't hold
+        the plane location, so the start of the path is used.
+    """
+    document = ElementTree.parse(input_file)
+
+    def read_coordinates(name, geometry):
+        for placemark in document.iter(KML + "Placemark"):
+            if placemark.findtext(KML + "name") == name:
+                element = placemark.find(".//" + geometry)
+                text = next(element.iter(KML + "coordinates")).text or ""
+                coordinates = [point.split(",") for point in text.split()]
+                return numpy.array(coordinates, dtype = float).reshape(-1, 3)
+        raise ValueError("The KML has no %s" % name)
+
+    path = read_coordinates("Flight Path", KML + "LineString")
+    searcharea = read_coordinates("Search Area", KML + "Polygon")
+    boundaries = read_coordinates("Flight Boundaries", KML + "Polygon")
+
+    # Coordinates are given as longitude, latitude, altitude. An empty path
+    # leaves nothing to take the plane location or the altitude from.
+    if len(path):
+        plane_location, altitude = path[0, 1::-1], path[0, 2]
+    else:
+        plane_location, altitude = (0.0, 0.0), 0.0
+    return Mission(plane_location, searcharea[:, 1::-1].tolist(),
+                   boundaries[:, 1::-1].tolist(), path[:, 1::-1], altitude)
@@ -0,0 +1,188 @@
+import numpy
+import shapely.geometry
+import shapely.prepared
+from shapely.strtree import STRtree
+from geometry_operations import dist
+
+# Zones are shrunk by this fraction of the size of their coordinates before
+# legs are tested against them, so that a leg that starts or ends on the
+# edge of a zone, up to rounding, doesn't count as crossing it
+TOLERANCE = 1e-9
+
+def _shortest_path(weights, source, target):
+    """
+        Returns the nodes of the shortest path from node *source* to node
+        *target* of the graph with the dense matrix of edge *weights*
+        (infinite where there is no edge), or None if there is none
+    """
+    distances = numpy.empty(len(weights))
+    distances.fill(numpy.inf)
+    distances[source] = 0
+    previous = numpy.zeros(len(weights), dtype=int)
+    done = numpy.zeros(len(weights), dtype=bool)
+
+    while True:
+        node = numpy.argmin(numpy.where(done, numpy.inf, distances))
+        if done[node] or distances[node] == numpy.inf:
+            return None
+        if node == target:
+            break
+        done[node] = True
+        through = distances[node] + weights[node]
+        shorter = (through < distances) & ~done
+        distances[shorter] = through[shorter]
+        previous[shorter] = node
+
+    path = [target]
+    while path[-1] != source:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+class NoFlyZones:
+    """
+        Polygons that the plane must not fly over. The zones are kept as
+        prepared geometries in an STRtree, so a leg is only tested against
+        the zones whose bounding boxes it passes through, and legs that
+        cross zones can be routed around them.
+    """
+
+    def __init__(self, zones):
+        self.zones = [numpy.asarray(zone, dtype=float).reshape(-1, 2) for zone in zones]
+        scale = max([numpy.abs(zone).max() for zone in self.zones if len(zone)] + [1.0])
+
+        self.__polygons = []
+        self.__prepared = []
+        self.__corners = []
+        for points in self.zones:
+            if len(points) > 1 and (points[0] == points[-1]).all():
+                points = points[:-1]
+            # Counterclockwise, so that the convex corners turn left
+            following = numpy.roll(points, -1, axis=0)
+            if (points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]).sum() < 0:
+                points = points[::-1]
+
+            polygon = shapely.geometry.Polygon(points)
+            self.__polygons.append(polygon.buffer(-TOLERANCE * scale, join_style=2))
+            self.__prepared.append(shapely.prepared.prep(self.__polygons[-1]))
+
+            # A shortest path only ever turns at the convex corners of a zone
+            before = points - numpy.roll(points, 1, axis=0)
+            after = numpy.roll(points, -1, axis=0) - points
+            turns = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+            self.__corners.append(points[turns > 0])
+
+        self.__indexed = [index for index, polygon in enumerate(self.__polygons)
+                          if not polygon.is_empty]
+        self.__tree = STRtree([self.__polygons[index] for index in self.__indexed]) \
+                      if self.__indexed else None
+        self.__ids = dict((id(self.__polygons[index]), index) for index in self.__indexed)
+        self.__crossings = {}
+
+    def __getstate__(self):
+        # Prepared geometries can't be pickled, so only the zones are kept
+        # and the rest is rebuilt from them
+        return {"zones": self.zones}
+
+    def __setstate__(self, state):
+        self.__init__(state["zones"])
+
+    def __query(self, geometry):
+        """
+            Returns the indices of the zones whose bounding boxes intersect
+            that of *geometry*
+        """
+        if self.__tree is None:
+            return []
+        # Shapely 2 returns the positions of the zones in the tree, older
+        # versions return the zones themselves
+        return [self.__ids[id(item)] if hasattr(item, "geom_type")
+                else self.__indexed[int(item)] for item in self.__tree.query(geometry)]
+
+    def crossed_zones(self, start, stop):
+        """
+            Returns the indices of the zones that the leg from *start* to
+            *stop* crosses. Legs that only touch a zone don't cross it.
+        """
+        start, stop = tuple(start), tuple(stop)
+        if start == stop:
+            leg = shapely.geometry.Point(start)
+        else:
+            leg = shapely.geometry.LineString([start, stop])
+        return [index for index in self.__query(leg)
+                if self.__prepared[index].intersects(leg)]
+
+    def __crossed_between_corners(self, corner, other_corner):
+        """
+            Returns crossed_zones between two corners, given as (zone,
+            index) pairs. Legs between corners are the same whatever the
+            path, so they are only tested once.
+        """
+        key = min(corner, other_corner), max(corner, other_corner)
+        if key not in self.__crossings:
+            self.__crossings[key] = self.crossed_zones(
+                    self.__corners[corner[0]][corner[1]],
+                    self.__corners[other_corner[0]][other_corner[1]])
+        return self.__crossings[key]
+
+    def route(self, start, stop):
+        """
+            Returns the points to fly through on the way from *start* to
+            *stop* to go around the zones, as an (N, 2) array, which is
+            empty if the direct leg crosses no zone. The route is the
+            shortest one that only turns at corners of the zones it has to
+            go around. If there is no such route, for example because
+            *start* is inside a zone, the direct leg is kept.
+        """
+        blocking = set(self.crossed_zones(start, stop))
+        considered = set()
+        while blocking - considered:
+            considered |= blocking
+            corners = [(zone, index) for zone in sorted(considered)
+                       for index in range(len(self.__corners[zone]))]
+            points = numpy.vstack([numpy.reshape(start, (1, 2)),
+                                   numpy.reshape(stop, (1, 2))] +
+                                  [self.__corners[zone] for zone in sorted(considered)])
+
+            # Nodes 0 and 1 are the ends of the leg, then come the corners
+            weights = numpy.empty((len(points), len(points)))
+            weights.fill(numpy.inf)
+            blocking = set()
+            for i in range(len(points)):
+                for j in range(i + 1, len(points)):
+                    if i < 2:
+                        crossed = self.crossed_zones(points[i], points[j])
+                    else:
+                        crossed = self.__crossed_between_corners(corners[i - 2],
+                                                                 corners[j - 2])
+                    if crossed:
+                        blocking.update(crossed)
+                    else:
+                        weights[i, j] = weights[j, i] = dist(points[i], points[j])
+
+            path = _shortest_path(weights, 0, 1)
+            if path is not None:
+                return points[path[1:-1]]
+
+        return numpy.zeros((0, 2))
+
+    def route_legs(self, points, legs):
+        """
+            Routes each of the *legs* of the path *points*, where leg i goes
+            from points[i] to points[i + 1], around the zones. Returns the
+            points of the new path, and the index in them of each of the
+            original points.
+        """
+        points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        detours = [(leg, self.route(points[leg], points[leg + 1])) for leg in legs]
+        detours = [(leg, detour) for leg, detour in detours if len(detour)]
+        if not detours:
+            return points, numpy.arange(len(points))
+
+        added = numpy.zeros(len(points), dtype=int)
+        for leg, detour in detours:
+            added[leg] = len(detour)
+        positions = numpy.repeat([leg + 1 for leg, detour in detours],
+                                 [len(detour) for leg, detour in detours])
+        routed = numpy.insert(points, positions,
+                              numpy.vstack([detour for leg, detour in detours]), axis=0)
+        return routed, numpy.arange(len(points)) + numpy.r_[0, numpy.cumsum(added)[:-1]]
@@ -1,9 +1,13 @@
+import sys
+import numpy
 import geometry_operations
-from geometry_operations import to_radians, dist
-from waypoint_generator import WaypointGenerator
-from image_generator import ImageGenerator
-from kml_generator import KMLGenerator
-from functools import partial
+import segment_ordering
+from anytime_plan import AnytimePlan
+from no_fly_zones import NoFlyZones
+from planning_stats import timed, count
+from projection import get_local_projection
+from geometry_operations import to_radians, Path
+from mission_exporter import export_mission
 
 class Pathfinder:
     """
@@ -14,97 +18,505 @@ class Pathfinder:
     OVERSHOOT_DISTANCE = 61
     MAX_DISTANCE_BETWEEN_WAYPOINTS = 50
     DEFAULT_ALTITUDE = 400
+    STREAMING_BAND_SIZE = 64
+    ORDERINGS = {
+        # From the current point, fly to the nearest point of a line segment
+        # that hasn't been seen, then along that line segment
+        "greedy": segment_ordering.order_greedy,
+        # Sweep the columns of each cell of the search area in turn,
+        # alternating direction
+        "boustrophedon": segment_ordering.order_boustrophedon
+    }
+    # The coordinate systems that the inputs can be given in, see the
+    # "projection" option
+    PROJECTIONS = [None, "local"]
+    # The criteria that the "scanline_offset" option can name instead of a
+    # distance
+    SCANLINE_OFFSET_CRITERIA = ["segments", "length"]
+
+    # The stages of planning, in order. Each stage depends on the stages
+    # before it, and on the attributes listed with it. Changing an attribute
+    # only recomputes the stages from the first one that depends on it.
+    STAGES = [
+        ("rotated_searcharea", ["searcharea", "wind_angle_degrees", "projection"]),
+        ("exclusions", ["holes", "no_fly_zones"]),
+        ("line_segments", ["path_width", "overshoot_distance", "scanline_offset"]),
+        ("order", ["plane_location", "completed_segments", "ordering",
+                   "optimization_time_budget"]),
+        ("waypoints", ["max_distance_between_waypoints"]),
+        ("path", [])
+    ]
+
+    def __add_intermediate_waypoints(self, path, distance):
+        """
+            Adds intermediate waypoints to the search path, between the vertical
+            lines, at most *distance* apart. This is necessary for ardupilot to
+            navigate the field without starying too far from the vertical lines.
+            Returns the waypoints, leg after leg, and the index of the last
+            waypoint of each leg.
+        """
+        return geometry_operations.densify_vertical_legs(path, distance)
 
-    @staticmethod
-    def __remove_sequential_duplicates(path):
+    def __get_projection(self):
         """
-            Removes sequential identical points from the path. 
-            The final path may still have duplicates, but it will not 
-            have any **sequential** duplicates.
+            Returns the LocalProjection that the path is planned in if the
+            "projection" option is "local", or None
         """
-        new_path = [path[0]]
-        for point in path[1:]:
-            if new_path[-1] != point:
-                new_path.append(point)
+        if self.projection == "local":
+            return get_local_projection(self.searcharea)
+        return None
 
-        return new_path
+    def __to_planar(self, points):
+        """
+            Returns *points*, given in the coordinate system of the inputs,
+            in the coordinate system that the path is planned in
+        """
+        projection = self.__get_projection()
+        return points if projection is None else projection.to_meters(points)
 
     @staticmethod
-    def __connect_path_line_segments(start_point, line_segments):
+    def __from_planar(points, projection):
         """
-            Returns a path generated from the line_segments that must be
-            traversed to search the field
+            Returns *points*, given in the coordinate system that the path is
+            planned in, as a Path in the coordinate system of the inputs,
+            which *projection* (see __get_projection) projects from
         """
+        return Path(points if projection is None else projection.to_degrees(points))
 
-        path = [start_point]
-        _line_segments = list(line_segments)
+    def __rotate_searcharea(self):
+        """
+            Rotates the search area such that the wind direction lies on the
+            line x = 0 (wind points straight up). Returns the center of
+            rotation, the angle and the rotated search area.
+        """
+        wind_angle_radians = to_radians(self.wind_angle_degrees)
+        searcharea = self.__to_planar(self.searcharea)
+        boundaries_center = geometry_operations.calculate_center(searcharea)
+        rotated_boundaries = geometry_operations.rotate(searcharea, boundaries_center,
+                                                        wind_angle_radians)
+        return boundaries_center, wind_angle_radians, rotated_boundaries
 
-        while _line_segments:
-            nearest_segment = geometry_operations.find_closest_line_segment(start_point, _line_segments)
+    def __rotate_exclusions(self):
+        """
+            Rotates the holes and no-fly zones like the search area. Returns
+            the rotated holes, the rotated no-fly zones, and the NoFlyZones
+            that indexes them, or None if there are none.
+        """
+        boundaries_center, wind_angle_radians = self.get_stage("rotated_searcharea")[:2]
 
-            segment_start, segment_end = nearest_segment
-            close_point, far_point = sorted([segment_start, segment_end], key =
-                    partial(dist, start_point))
-            # Always travel to the closer point on the line_segment_first
-            path += [close_point, far_point]
-            _line_segments.remove(nearest_segment)
-            start_point = far_point
+        def rotate_all(polygons):
+            return [geometry_operations.rotate(self.__to_planar(polygon),
+                    boundaries_center, wind_angle_radians) for polygon in polygons]
 
-        return path
+        holes, no_fly_zones = rotate_all(self.holes), rotate_all(self.no_fly_zones)
+        return holes, no_fly_zones, NoFlyZones(no_fly_zones) if no_fly_zones else None
 
+    def __calculate_line_segments(self):
+        """
+            Generates vertical line segments through the rotated search area,
+            that are *path_width* apart from each other, leaving out the holes
+            and no-fly zones
+        """
+        boundaries = self.get_stage("rotated_searcharea")[2]
+        holes, no_fly_zones = self.get_stage("exclusions")[:2]
+        line_segments = geometry_operations.calculate_line_segments(boundaries,
+                self.path_width, self.overshoot_distance,
+                self.__resolve_scanline_offset(boundaries), holes, no_fly_zones)
+        count(self.stats, "line_segments", len(line_segments))
+        return line_segments
+
+    def __resolve_scanline_offset(self, boundaries, band_size = STREAMING_BAND_SIZE):
+        """
+            Returns the "scanline_offset" option as a distance, finding the
+            best offset for the rotated *boundaries* if it names a criterion.
+            The offsets tried are evaluated *band_size* lines at a time.
+        """
+        offset = self.scanline_offset
+        if offset in Pathfinder.SCANLINE_OFFSET_CRITERIA:
+            holes, no_fly_zones = self.get_stage("exclusions")[:2]
+            offset = geometry_operations.optimize_scanline_offset(boundaries,
+                    self.path_width, self.overshoot_distance, offset,
+                    holes = holes, no_fly_zones = no_fly_zones,
+                    band_size = band_size)
+        return offset
+
+    def __rotate_plane_location(self):
+        """
+            Returns the plane location in the rotated coordinate system
+        """
+        boundaries_center, wind_angle_radians = self.get_stage("rotated_searcharea")[:2]
+        return geometry_operations.rotate(self.__to_planar([self.plane_location]),
+                boundaries_center, wind_angle_radians)[0]
 
-    def __add_intermediate_waypoints(self, path):
+    def __order_line_segments(self):
         """
-            Adds intermediate waypoints to the search path, between the vertical
-            lines. This is necessary for ardupilot to navigate the field without
-            starying too far from the vertical lines.
+            Orders the line segments that haven't been completed as selected
+            by the "ordering" option (see Pathfinder.ORDERINGS), then improves
+            the order for up to "optimization_time_budget" seconds. Returns
+            the order, how much shorter the improvements made the path, and
+            the plane location in the rotated coordinate system.
+        """
+        start_point = self.__rotate_plane_location()
+        remaining, remaining_segments = self.__get_remaining_segments()
+
+        order = timed(self.stats, "order.initial", Pathfinder.ORDERINGS[self.ordering],
+                      start_point, remaining_segments, self.stats)
+        improvement = 0.0
+        if self.optimization_time_budget > 0:
+            order, improvement = timed(self.stats, "order.improve",
+                    lambda: segment_ordering.improve_order(start_point,
+                            remaining_segments, order, self.optimization_time_budget,
+                            stats = self.stats))
+
+        order = [(int(remaining[index]), reverse) for index, reverse in order]
+        return order, improvement, start_point
+
+    def __get_remaining_segments(self):
+        """
+            Returns the indices of the line segments that haven't been
+            completed, and those line segments
+        """
+        line_segments = self.get_stage("line_segments")
+        is_remaining = numpy.ones(len(line_segments), dtype=bool)
+        is_remaining[list(self.completed_segments)] = False
+        remaining = numpy.flatnonzero(is_remaining)
+        return remaining, line_segments[remaining]
+
+    def __calculate_waypoints(self):
+        """
+            Connects the ordered line segments into a path, and adds the
+            intermediate waypoints. Returns the path, and for each line segment
+            in the order, the index of the waypoint where it is completed.
         """
-        def add_intermediates(line):
-            return geometry_operations.partition_line_segment_if_vertical(line, self.max_distance_between_waypoints)
+        order, improvement, start_point = self.get_stage("order")
+        return self.__connect_line_segments(start_point,
+                self.get_stage("line_segments"), order,
+                self.max_distance_between_waypoints,
+                self.get_stage("exclusions")[2], self.stats)
+
+    def __connect_line_segments(self, start_point, line_segments, order, distance,
+                                no_fly_zones = None, stats = None):
+        """
+            Does the work of __calculate_waypoints for the given inputs, with
+            intermediate waypoints at most *distance* apart, and the legs
+            between line segments routed around *no_fly_zones* (a
+            NoFlyZones) if given. Its steps are recorded in *stats*, if
+            given.
+        """
+        path = timed(stats, "waypoints.connect", segment_ordering.connect_ordered,
+                     start_point, line_segments, order)
+
+        # Leg 2*i + 1 of the connected path flies the i-th line segment in the
+        # order, and the legs between them are routed
+        segment_legs = numpy.arange(1, len(path) - 1, 2)
+        if no_fly_zones is not None:
+            points, indices = timed(stats, "waypoints.route", no_fly_zones.route_legs,
+                                    path.points, range(0, len(path) - 1, 2))
+            count(stats, "routed_waypoints", len(points) - len(path))
+            path, segment_legs = Path(points), indices[segment_legs]
+
+        waypoints, leg_ends = timed(stats, "waypoints.densify",
+                self.__add_intermediate_waypoints, path, distance)
+        if not len(leg_ends):
+            return path, []
+
+        # The last point of a line segment's leg is where that line segment is
+        # completed, or the point it duplicates, once sequential duplicates
+        # are removed
+        def remove_duplicates():
+            duplicates = waypoints.get_sequential_duplicates()
+            completed_at = (numpy.cumsum(~duplicates) - 1)[leg_ends[segment_legs]]
+            return waypoints.remove_sequential_duplicates(), completed_at.tolist()
+
+        unique_waypoints, completed_at = timed(stats, "waypoints.dedup",
+                                               remove_duplicates)
+        count(stats, "waypoints_before_dedup", len(waypoints))
+        count(stats, "waypoints_after_dedup", len(unique_waypoints))
+        return unique_waypoints, completed_at
+
+    def __calculate_path(self):
+        """
+            "Unrotates" the waypoints to return a path that is valid for the
+            original orientation of the search area boundaries
+        """
+        boundaries_center, wind_angle_radians = self.get_stage("rotated_searcharea")[:2]
+        return self.__from_planar(geometry_operations.rotate(
+                self.get_stage("waypoints")[0], boundaries_center, -wind_angle_radians),
+                self.__get_projection())
 
-        path_lines = geometry_operations.to_line_segments(path)[:-1]
-        new_path = [add_intermediates(line) for line in path_lines]
-        return [point for points in new_path for point in points]
+    def get_stage(self, name):
+        """
+            Returns the result of the stage of planning called *name* (see
+            Pathfinder.STAGES), computing it and the stages before it if
+            necessary. Each stage is only timed once the stage before it has
+            been computed, so that the time recorded is its own.
+        """
+        if name not in self.__stages:
+            index = [stage for stage, inputs in Pathfinder.STAGES].index(name)
+            if index:
+                self.get_stage(Pathfinder.STAGES[index - 1][0])
+
+            compute = {
+                "rotated_searcharea": self.__rotate_searcharea,
+                "exclusions": self.__rotate_exclusions,
+                "line_segments": self.__calculate_line_segments,
+                "order": self.__order_line_segments,
+                "waypoints": self.__calculate_waypoints,
+                "path": self.__calculate_path
+            }[name]
+            self.__stages[name] = timed(self.stats, name, compute)
+
+        return self.__stages[name]
+
+    def __invalidate(self, attribute):
+        """
+            Forgets the results of the stages that depend on *attribute*. If
+            the line segments change, the indices of the completed line
+            segments no longer refer to them, so they are forgotten too.
+        """
+        stages = [stage for stage, inputs in Pathfinder.STAGES]
+        for index, (stage, inputs) in enumerate(Pathfinder.STAGES):
+            if attribute in inputs:
+                if index <= stages.index("line_segments"):
+                    self.completed_segments = frozenset()
+                for later_stage, later_inputs in Pathfinder.STAGES[index:]:
+                    self.__stages.pop(later_stage, None)
+                return
+
+    def __set(self, attribute, value):
+        setattr(self, attribute, value)
+        self.__invalidate(attribute)
 
     def get_path(self):
         """
-            Calculates the path if necessary, then returns it
+            Calculates the list of waypoints that the plane must navigate to
+            traverse the search area if necessary, then returns it
+        """
+        if "path" not in self.__stages and self.plan_cache is not None:
+            # Only what the stages read is keyed on, so that changing the
+            # boundaries or the altitude still finds the same path
+            inputs = dict((attribute, getattr(self, attribute))
+                          for stage, stage_inputs in Pathfinder.STAGES
+                          for attribute in stage_inputs)
+            inputs["completed_segments"] = sorted(self.completed_segments)
+            key = self.plan_cache.key(inputs)
+            path = self.plan_cache.get(key)
+            count(self.stats, "plan_cache_misses" if path is None else "plan_cache_hits")
+            if path is None:
+                self.plan_cache.put(key, self.get_stage("path"))
+            else:
+                self.__stages["path"] = path
+
+        return self.get_stage("path")
+
+    def iter_path_chunks(self, band_size = STREAMING_BAND_SIZE):
+        """
+            Plans the path one band of *band_size* scanlines at a time, and
+            yields the waypoints of each band as a Path as soon as they are
+            planned. Only one band is held in memory, so this suits search
+            areas too large for get_path. Chained together, the chunks make
+            up the whole path, which starts at the plane location.
+
+            The line segments of each band are ordered by the "ordering"
+            option from where the previous band ended, and
+            "optimization_time_budget" is not used. If the search area fits
+            in one band, the path is the same as get_path would return
+            without a time budget. Nothing is cached.
+        """
+        boundaries_center, wind_angle_radians, boundaries = \
+                self.get_stage("rotated_searcharea")
+        holes, no_fly_zones, zone_index = self.get_stage("exclusions")
+        start_point = self.__rotate_plane_location()
+        projection = self.__get_projection()
+        bands = geometry_operations.iter_line_segment_bands(boundaries,
+                self.path_width, self.overshoot_distance,
+                self.__resolve_scanline_offset(boundaries, band_size), band_size,
+                holes, no_fly_zones)
+
+        def unrotate(waypoints):
+            return self.__from_planar(geometry_operations.rotate(waypoints,
+                    boundaries_center, -wind_angle_radians), projection)
+
+        first_index = 0
+        started = False
+        for line_segments in bands:
+            indices = numpy.arange(first_index, first_index + len(line_segments))
+            first_index += len(line_segments)
+            is_remaining = [index not in self.completed_segments for index in indices]
+            remaining_segments = line_segments[numpy.array(is_remaining, dtype=bool)]
+            if not len(remaining_segments):
+                continue
+
+            order = Pathfinder.ORDERINGS[self.ordering](start_point,
+                                                         remaining_segments)
+            waypoints = self.__connect_line_segments(start_point,
+                    remaining_segments, order, self.max_distance_between_waypoints,
+                    zone_index)[0]
+
+            # Every band after the first starts where the one before it ended
+            yield unrotate(waypoints if not started else waypoints[1:])
+            start_point = waypoints[-1]
+            started = True
+
+        if not started:
+            yield unrotate([start_point])
+
+    def iter_path(self, band_size = STREAMING_BAND_SIZE):
         """
-        if self.__path is None:
-            self.__path = self.__calculate_path()
+            Yields the waypoints of the path one by one, planning them a band
+            at a time, see iter_path_chunks
+        """
+        for chunk in self.iter_path_chunks(band_size):
+            for point in chunk:
+                yield point
 
-        return self.__path
+    def plan_anytime(self, callback = None, time_budget = None):
+        """
+            Plans the path with the "ordering" option alone, which is fast,
+            then keeps improving its order in a background thread as
+            "optimization_time_budget" would, for up to *time_budget* seconds
+            or until no move shortens it if None. Returns an AnytimePlan that
+            holds the best path so far and can cancel the refinement. Each
+            better path is passed to *callback*(path, improvement).
+
+            The plan is made from the inputs as they are now; the Pathfinder
+            itself is left unchanged and can be used meanwhile.
+        """
+        boundaries_center, wind_angle_radians = self.get_stage("rotated_searcharea")[:2]
+        line_segments = self.get_stage("line_segments")
+        zone_index = self.get_stage("exclusions")[2]
+        distance = self.max_distance_between_waypoints
+        start_point = self.__rotate_plane_location()
+        projection = self.__get_projection()
+        remaining, remaining_segments = self.__get_remaining_segments()
+        order = Pathfinder.ORDERINGS[self.ordering](start_point, remaining_segments)
+
+        def to_plan(order):
+            """
+                Returns the path that flies *order*, which is an order of the
+                remaining line segments, and the order of all line segments
+            """
+            order = [(int(remaining[index]), reverse) for index, reverse in order]
+            waypoints = self.__connect_line_segments(start_point, line_segments,
+                                                     order, distance, zone_index)[0]
+            return self.__from_planar(geometry_operations.rotate(waypoints,
+                    boundaries_center, -wind_angle_radians), projection), order
+
+        def refine(publish, should_stop):
+            def improved(better_order, improvement):
+                path, better_order = to_plan(better_order)
+                publish(path, better_order, improvement)
+            segment_ordering.improve_order(start_point, remaining_segments, order,
+                                           time_budget, improved, should_stop)
+
+        path, initial_order = to_plan(order)
+        return AnytimePlan(path, initial_order, refine, callback)
+
+    def get_path_improvement(self):
+        """
+            Returns how much shorter the path became when its ordering was
+            improved, see the "optimization_time_budget" option
+        """
+        return self.get_stage("order")[1]
 
-    def __calculate_path(self):
+    def get_options(self):
+        """
+            Returns the options that the path is planned with, including the
+            defaults of those that weren't given
+        """
+        return {
+            "path_width": self.path_width,
+            "overshoot_distance": self.overshoot_distance,
+            "max_distance_between_waypoints": self.max_distance_between_waypoints,
+            "wind_angle_degrees": self.wind_angle_degrees,
+            "scanline_offset": self.scanline_offset,
+            "ordering": self.ordering,
+            "optimization_time_budget": self.optimization_time_budget,
+            "projection": self.projection,
+            "holes": self.holes,
+            "no_fly_zones": self.no_fly_zones,
+            "wp_altitude": self.wp_altitude
+        }
+
+    def get_segment_order(self):
         """
-            Calculates the list of waypoints that the plane must navigate to traverse 
-            the search area. 
-            1. Rotates the search area such that the wind direction points
-               lies on the line x = 0 (wind points straight up)
-            2. Generates vertical line segments through the boundaries, that are
-               *path_width* apart from each other
-            3. Connects the line_segments to each other to form the most
-               efficient path between them
-            4. "Unrotates" to return a path that is valid for the original
-               orientation of the search area boundaries
+            Returns the order in which the path flies the line segments (see
+            get_stage("line_segments")), as a list of (index, reverse) pairs
         """
+        return self.get_stage("order")[0]
 
-        def compute_path_rotated(boundaries, plane_location):
-            line_segments = geometry_operations.calculate_line_segments(boundaries,
-                    self.path_width, self.overshoot_distance)
-            path = Pathfinder.__connect_path_line_segments(plane_location, line_segments)
-            path = self.__add_intermediate_waypoints(path)
-            return self.__remove_sequential_duplicates(path)
+    def get_completed_segments(self, last_waypoint):
+        """
+            Returns the set of indices of the line segments that have been
+            flown once the plane has reached waypoint *last_waypoint* of the
+            path. A line segment is only completed at its far end.
+        """
+        order = self.get_stage("order")[0]
+        completed_at = self.get_stage("waypoints")[1]
+        return self.completed_segments | frozenset(index for (index, reverse), waypoint
+                in zip(order, completed_at) if waypoint <= last_waypoint)
 
-        def unrotate_path(path, boundaries_center, wind_angle_radians):
-            return geometry_operations.rotate(path, boundaries_center, -wind_angle_radians)
+    def replan(self, current_location, completed_segments = (), last_waypoint = None):
+        """
+            Replans the rest of the search from *current_location*, for when
+            the plane is diverted mid-search. The line segments that have
+            already been flown are given by their indices in
+            *completed_segments*, or by the index in the current path of the
+            *last_waypoint* that the plane reached, or both. Line segments
+            completed in earlier replans stay completed, until an option
+            or input that changes the line segments is set.
+
+            The line segments are kept, and only those that are left are
+            reordered. Returns the new path.
+        """
+        completed = self.completed_segments | frozenset(completed_segments)
+        if last_waypoint is not None:
+            completed |= self.get_completed_segments(last_waypoint)
 
-        wind_angle_radians = to_radians(self.wind_angle_degrees)
-        boundaries_center = geometry_operations.calculate_center(self.searcharea)
-        rotated_boundaries = geometry_operations.rotate(self.searcharea, boundaries_center,
-                                                        wind_angle_radians)
-        rotated_path = compute_path_rotated(rotated_boundaries, self.plane_location)
-        return unrotate_path(rotated_path, boundaries_center, wind_angle_radians)
+        self.__set("completed_segments", completed)
+        self.set_plane_location(current_location)
+        return self.get_path()
+
+    def set_options(self, options):
+        """
+            Changes the given options, keeping the others. Only the stages of
+            planning that depend on the changed options are recomputed.
+        """
+        known_options = self.get_options()
+        for name in options:
+            if name not in known_options:
+                raise ValueError("Unknown option: %s" % name)
+        if options.get("ordering", self.ordering) not in Pathfinder.ORDERINGS:
+            raise ValueError("Unknown ordering: %s" % options["ordering"])
+        if options.get("projection", self.projection) not in Pathfinder.PROJECTIONS:
+            raise ValueError("Unknown projection: %s" % options["projection"])
+        if "scanline_offset" in options:
+            Pathfinder.__check_scanline_offset(options["scanline_offset"])
+
+        for name, value in options.items():
+            self.__set(name, value)
+
+    @staticmethod
+    def __check_scanline_offset(offset):
+        """
+            Raises a ValueError if *offset*, a "scanline_offset" option, is a
+            string that doesn't name a criterion
+        """
+        if isinstance(offset, basestring) and \
+           offset not in Pathfinder.SCANLINE_OFFSET_CRITERIA:
+            raise ValueError("Unknown scanline offset: %s" % offset)
+
+    def set_plane_location(self, plane_location):
+        self.__set("plane_location", plane_location)
+
+    def set_searcharea(self, searcharea):
+        self.__set("searcharea", searcharea)
+
+    def set_boundaries(self, boundaries):
+        self.__set("boundaries", boundaries)
+
+    def set_altitude(self, altitude):
+        self.__set("wp_altitude", altitude)
 
     def get_altitude(self):
 	return self.wp_altitude
@@ -115,7 +527,8 @@ class Pathfinder:
     def get_boundaries(self):
 	return self.boundaries
 
-    def __init__(self, plane_location, searcharea, boundaries, options = dict()):
+    def __init__(self, plane_location, searcharea, boundaries, options = dict(),
+                 plan_cache = None, stats = None):
         """
             Constructor for pathfinder object. 
 
@@ -139,6 +552,43 @@ class Pathfinder:
                     The orientation of the wind. This value should be a floating
                     point number or integer. For reference, the line_segment
                     ((0,0) (1,0)), would have a zero degree angle.
+                "scanline_offset":
+                    The distance between the leftmost point of the search area
+                    (once rotated) and the first pass. Defaults to 0. If set to
+                    "segments" or "length", the offset in [0, path_width) that
+                    gives the fewest line segments or the shortest total
+                    length of line segments is used.
+                "ordering":
+                    How the line segments are ordered into a path. "greedy"
+                    (the default) always flies to the nearest unseen line
+                    segment. "boustrophedon" sweeps the search area column by
+                    column, finishing each part of a concave area before
+                    moving on, which avoids long transits back and forth.
+                "optimization_time_budget":
+                    The number of seconds to spend shortening the ordered path
+                    with 2-opt and Or-opt moves. Defaults to 0, which leaves
+                    the ordering as it is.
+                "projection":
+                    The coordinate system of the inputs. If None (the
+                    default), they are planned in as they are. If "local",
+                    the plane location, search area and path are (latitude,
+                    longitude) pairs in degrees, and are projected to meters
+                    for planning (see projection.LocalProjection), so that
+                    the distances in the other options are in meters.
+                "holes":
+                    A list of polygons inside the search area that don't need
+                    to be searched. The plane may still fly over them.
+                "no_fly_zones":
+                    A list of polygons that the plane must not fly over.
+                    They are not searched, the padding of the passes stops
+                    at them, and the legs between passes go around them.
+            plan_cache: An optional PlanCache. If it holds a path planned from
+                        the same inputs, that path is used instead of
+                        planning a new one. The points of a cached path
+                        are read-only.
+            stats: An optional PlanningStats, which records the time taken by
+                   each stage of planning and counts what it did. Nothing is
+                   recorded without one.
         """
 
         self.path_width = options.get("path_width", Pathfinder.PATH_WIDTH)
@@ -148,17 +598,28 @@ class Pathfinder:
         options.get("max_distance_between_waypoints", 
                     Pathfinder.MAX_DISTANCE_BETWEEN_WAYPOINTS)
         self.wind_angle_degrees = options.get("wind_angle_degrees", 0)
+        self.scanline_offset = options.get("scanline_offset", 0)
+        Pathfinder.__check_scanline_offset(self.scanline_offset)
+        self.ordering = options.get("ordering", "greedy")
+        if self.ordering not in Pathfinder.ORDERINGS:
+            raise ValueError("Unknown ordering: %s" % self.ordering)
+        self.optimization_time_budget = options.get("optimization_time_budget", 0)
+        self.projection = options.get("projection")
+        self.holes = options.get("holes", [])
+        self.no_fly_zones = options.get("no_fly_zones", [])
+        if self.projection not in Pathfinder.PROJECTIONS:
+            raise ValueError("Unknown projection: %s" % self.projection)
         self.searcharea = searcharea
 	self.boundaries = boundaries
         self.plane_location = plane_location
+        self.completed_segments = frozenset()
 	self.wp_altitude = options.get("wp_altitude", Pathfinder.DEFAULT_ALTITUDE)
-        self.__path = None # Will be evaluated lazily
+        self.plan_cache = plan_cache
+        self.stats = stats
+        self.__stages = {} # Will be evaluated lazily
 
 def main():
 
-    def meters_to_gps(meters):
-        return meters / 111122.0
-
     def meters_to_feet(meters):
 	return meters * 0.3048
 
@@ -186,23 +647,29 @@ def main():
 			(38.14452836874776, -76.4310129102313),
 			(38.14325436740429, -76.43484836856422)]
 
+    # The coordinates are GPS coordinates, so the distances are in meters
     options = {
+        "projection": "local",
         "wind_angle_degrees": 30,
-        "path_width": meters_to_gps(30),
-        "overshoot_distance": meters_to_gps(-30),
-        "dist_between": meters_to_gps(30),
+        "path_width": 30,
+        "overshoot_distance": -30,
+        "dist_between": 30,
 	"wp_altitude": 300.0
     }
     # FIXME is wp_altitude in m or ft?
 
     finder = Pathfinder(plane_location, searcharea, flightboundaries, options)
-    waypoint_generator = WaypointGenerator(finder)
-    image_generator = ImageGenerator(finder)
-    kml_generator = KMLGenerator(finder)
-                
-    #waypoint_generator.export_qgc_waypoints()
-    image_generator.create_image("output.jpg")
-    kml_generator.export_kml()
+
+    # The exports run concurrently, from a single plan
+    outputs = {
+        #"qgc": "output.txt",
+        "image": "output.jpg",
+        "kml": sys.stdout
+    }
+    for name, result in sorted(export_mission(finder, outputs).items()):
+        print >> sys.stderr, "%s: %.3fs" % (name, result.seconds)
+        if not result.succeeded():
+            print >> sys.stderr, result.error
 
 if __name__ == '__main__':
     main()
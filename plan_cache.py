@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy
+from geometry_operations import Path
+
+def _canonical(value):
+    """
+        Returns a copy of *value* made only of JSON types, such that equal
+        planning inputs give equal copies: numbers become floats, and
+        sequences of any kind (including NumPy arrays) become lists
+    """
+    if isinstance(value, dict):
+        return dict((str(key), _canonical(item)) for key, item in value.items())
+    if isinstance(value, (bool, basestring)) or value is None:
+        return value
+    if isinstance(value, (int, long, float, numpy.number)):
+        return float(value)
+    return [_canonical(item) for item in value]
+
+class PlanCache:
+    """
+        Caches planned paths by a hash of everything that went into planning
+        them. The most recently used *max_entries* paths are kept in memory.
+        If *directory* is given, every path is also saved there, so that it
+        survives restarts and can be shared between processes.
+
+        Every lookup of a path returns the same Path, so the points of the
+        paths it holds are made read-only.
+
+        Pass a PlanCache to Pathfinder to use it. *hits* and *misses* count
+        lookups; *disk_hits* counts the hits that had to be loaded from disk.
+    """
+
+    def __init__(self, max_entries = 128, directory = None):
+        assert max_entries > 0
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(inputs):
+        """
+            Returns the key of the plan for *inputs*, a dict of the inputs of
+            the stages of planning (see Pathfinder.STAGES)
+        """
+        inputs = _canonical(inputs)
+        text = json.dumps(inputs, sort_keys = True, separators = (",", ":"))
+        return hashlib.sha256(text).hexdigest()
+
+    def __filename(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def __remember(self, key, path):
+        """
+            Puts *path* in memory as the most recently used entry, evicting
+            the least recently used one if the cache is full
+        """
+        if isinstance(path, Path):
+            path.points.setflags(write = False)
+        self.__entries.pop(key, None)
+        self.__entries[key] = path
+        if len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last = False)
+
+    def get(self, key):
+        """
+            Returns the path stored under *key*, or None if there isn't one
+        """
+        with self.__lock:
+            path = self.__entries.get(key)
+            if path is not None:
+                self.hits += 1
+                self.__remember(key, path)
+                return path
+
+            if self.directory is not None and \
+               os.path.exists(self.__filename(key)):
+                path = Path(numpy.load(self.__filename(key)))
+                self.hits += 1
+                self.disk_hits += 1
+                self.__remember(key, path)
+                return path
+
+            self.misses += 1
+            return None
+
+    def put(self, key, path):
+        """
+            Stores *path* under *key*
+        """
+        with self.__lock:
+            self.__remember(key, path)
+            if self.directory is None:
+                return
+
+            # Write to a temporary file first, so that a reader never sees a
+            # partially written path
+            handle, temporary = tempfile.mkstemp(dir = self.directory,
+                                                 suffix = ".tmp")
+            with os.fdopen(handle, "wb") as temporary_file:
+                numpy.save(temporary_file, numpy.asarray(path, dtype = float))
+            os.rename(temporary, self.__filename(key))
+
+    def clear(self):
+        """
+            Empties the in-memory tier. Paths saved on disk are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
@@ -0,0 +1,85 @@
+import time
+
+def timed(stats, name, compute, *args):
+    """
+        Returns compute(*args), recording how long it took as stage *name*
+        of *stats*. If *stats* is None, nothing is recorded, so callers can
+        time their work whether or not stats are being collected.
+    """
+    if stats is None:
+        return compute(*args)
+
+    start = time.time()
+    result = compute(*args)
+    stats.record_stage(name, time.time() - start)
+    return result
+
+def count(stats, name, amount = 1):
+    """
+        Adds *amount* to counter *name* of *stats*, unless it is None
+    """
+    if stats is not None:
+        stats.count(name, amount)
+
+class PlanningStats:
+    """
+        Collects what planning a path did: the wall time and number of calls
+        of each stage (see Pathfinder.STAGES, and the steps within them,
+        named like "waypoints.densify"), and counters such as the number of
+        line segments generated or of distances evaluated while ordering.
+
+        Pass a PlanningStats to Pathfinder to use it. Without one, nothing is
+        recorded and planning is not slowed down. Each *hook* is called as
+        hook(kind, name, value) for everything recorded, where *kind* is
+        "seconds" for the time of a stage and "count" for a counter, so that
+        the stats can be forwarded to a metrics system as they are recorded.
+    """
+
+    def __init__(self, hooks = ()):
+        self.hooks = list(hooks)
+        self.reset()
+
+    def reset(self):
+        """
+            Forgets everything recorded so far, keeping the hooks
+        """
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def record_stage(self, name, seconds):
+        """
+            Records one call of stage *name* that took *seconds*
+        """
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+        self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+        for hook in self.hooks:
+            hook("seconds", name, seconds)
+
+    def count(self, name, amount = 1):
+        """
+            Adds *amount* to counter *name*
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+        for hook in self.hooks:
+            hook("count", name, amount)
+
+    def as_dict(self):
+        """
+            Returns everything recorded, as a dict that can be saved as JSON
+        """
+        return {
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_calls": dict(self.stage_calls),
+            "counters": dict(self.counters)
+        }
+
+    def __str__(self):
+        lines = ["%-24s %4d calls %9.4fs" % (name, self.stage_calls[name],
+                 self.stage_seconds[name]) for name in sorted(self.stage_seconds)]
+        lines += ["%-24s %d" % (name, value)
+                  for name, value in sorted(self.counters.items())]
+        return "\n".join(lines)
@@ -0,0 +1,74 @@
+import numpy
+from math import radians, sin, cos, sqrt
+
+# The WGS84 ellipsoid, which GPS coordinates are given on
+SEMI_MAJOR_AXIS = 6378137.0
+FLATTENING = 1 / 298.257223563
+ECCENTRICITY_SQUARED = FLATTENING * (2 - FLATTENING)
+
+class LocalProjection:
+    """
+        Projects (latitude, longitude) points in degrees to (north, east)
+        points in meters from *origin*, and back. The projection is
+        equirectangular, scaled by the radii of curvature of the WGS84
+        ellipsoid at *origin*, so lengths are true near *origin* and off by
+        well under a meter across a search area a few kilometers wide.
+
+        North comes first so that the axes keep their meaning: the x axis
+        of the planner runs along latitude whether or not it is projected.
+    """
+
+    def __init__(self, origin):
+        self.origin = numpy.array(origin, dtype = float).reshape(2)
+        latitude = radians(self.origin[0])
+        w = 1 - ECCENTRICITY_SQUARED * sin(latitude) ** 2
+        meridional_radius = SEMI_MAJOR_AXIS * (1 - ECCENTRICITY_SQUARED) / w ** 1.5
+        prime_vertical_radius = SEMI_MAJOR_AXIS / sqrt(w)
+
+        # Meters per degree of latitude and of longitude
+        self.scale = numpy.array([radians(meridional_radius),
+                                  radians(prime_vertical_radius * cos(latitude))])
+
+    def to_meters(self, points):
+        """
+            Returns *points*, a sequence of (latitude, longitude) pairs, as
+            an (N, 2) array of (north, east) meters from the origin
+        """
+        differences = numpy.asarray(points, dtype = float).reshape(-1, 2) - self.origin
+        # Take the short way around across the antimeridian
+        differences[:, 1] = (differences[:, 1] + 180) % 360 - 180
+        return differences * self.scale
+
+    def to_degrees(self, points):
+        """
+            Returns *points*, a sequence of (north, east) pairs in meters, as
+            an (N, 2) array of (latitude, longitude) pairs
+        """
+        degrees = numpy.asarray(points, dtype = float).reshape(-1, 2) / self.scale + \
+                  self.origin
+        # Longitudes past the antimeridian wrap around to the other side
+        degrees[:, 1] = (degrees[:, 1] + 180) % 360 - 180
+        return degrees
+
+# Projections made so far, by the centroid of the points they were made
+# for, so that planning the same area again doesn't recompute them
+MAX_CACHED_PROJECTIONS = 128
+_projections = {}
+
+def get_local_projection(points):
+    """
+        Returns the LocalProjection centered on the centroid of *points*,
+        which are (latitude, longitude) pairs
+    """
+    points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+    # Average the longitudes as offsets from the first point, so that an
+    # area across the antimeridian is centered on it rather than on 0
+    offsets = (points[:, 1] - points[0, 1] + 180) % 360 - 180
+    center = (points[:, 0].mean(),
+              (points[0, 1] + offsets.mean() + 180) % 360 - 180)
+    projection = _projections.get(center)
+    if projection is None:
+        if len(_projections) >= MAX_CACHED_PROJECTIONS:
+            _projections.clear()
+        projection = _projections[center] = LocalProjection(center)
+    return projection
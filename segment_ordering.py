@@ -0,0 +1,598 @@
+import time
+import numpy
+from scipy.spatial import cKDTree
+import planning_stats
+from geometry_operations import Path, path_length
+
+# Moves that shorten the path by less than this are not worth making
+EPSILON = 1e-9
+
+class LazyTree:
+    """
+        cKDTree over *points* that points can be removed from. Removed points
+        are skipped lazily, until they make up half the tree, and then the
+        tree is rebuilt from the points left. Queries return the indices of
+        points in *points*, which may include removed ones.
+    """
+
+    def __init__(self, points):
+        self.points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        self.alive = numpy.ones(len(self.points), dtype=bool)
+        self.__rebuild()
+
+    def __rebuild(self):
+        """
+            Rebuilds the tree from the points that have not been removed
+        """
+        self.__ids = numpy.flatnonzero(self.alive)
+        self.__tree = cKDTree(self.points[self.__ids])
+        self.__stale = 0
+
+    def size(self):
+        """
+            Returns the number of points in the tree, removed or not
+        """
+        return len(self.__ids)
+
+    def remove(self, ids):
+        """
+            Removes the points *ids*
+        """
+        self.alive[ids] = False
+        self.__stale += len(self.alive[ids])
+        if self.alive.any() and 2 * self.__stale > len(self.__ids):
+            self.__rebuild()
+
+    def query(self, points, k):
+        """
+            Returns the distances to the *k* nearest points in the tree to
+            each of *points*, and their indices, shaped like cKDTree.query
+        """
+        distances, tree_ids = self.__tree.query(points, k)
+        return distances, self.__ids[tree_ids]
+
+    def query_ball_point(self, point, radius):
+        """
+            Returns the indices of the points in the tree within *radius*
+            of *point*
+        """
+        return self.__ids[self.__tree.query_ball_point(point, radius)]
+
+class EndpointIndex:
+    """
+        Nearest neighbour index over the end points of a list of line
+        segments. Line segments can be removed from the index once they have
+        been visited. If *stats* is given, the distances computed to find
+        the nearest end points are counted in its "distance_evaluations".
+    """
+
+    def __init__(self, line_segments, stats = None):
+        # End point 2*i is the start of line segment i, 2*i + 1 is its end
+        self.__tree = LazyTree(line_segments)
+        self.points = self.__tree.points
+        self.remaining = len(self.points) // 2
+        self.stats = stats
+
+    def remove(self, index):
+        """
+            Removes both end points of line segment *index* from the index
+        """
+        self.__tree.remove(slice(2*index, 2*index + 2))
+        self.remaining -= 1
+
+    def nearest(self, point):
+        """
+            Returns (index, reverse) for the line segment that contains the end
+            point nearest to *point*. *reverse* is True if that end point is
+            the end of the line segment rather than its start. Ties are broken
+            the same way as find_closest_line_segment: the line segment that
+            comes first wins, and its start wins over its end.
+        """
+        assert self.remaining > 0
+
+        k = 1
+        while True:
+            k = min(k, self.__tree.size())
+            distances, ids = self.__tree.query(point, k)
+            distances = numpy.atleast_1d(distances)
+            alive = self.__tree.alive[numpy.atleast_1d(ids)]
+            if alive.any():
+                distance = distances[alive][0]
+                break
+            k *= 2
+
+        # The tree's distances may differ from dist in the last bit, so gather
+        # every near tie and settle it with the same arithmetic as dist
+        radius = distance * (1 + 1e-9) + numpy.finfo(float).tiny
+        ids = self.__tree.query_ball_point(point, radius)
+        ids = ids[self.__tree.alive[ids]]
+        candidates = self.points[ids]
+        exact = numpy.sqrt((candidates[:, 1] - point[1]) ** 2 +
+                           (candidates[:, 0] - point[0]) ** 2)
+        best = ids[numpy.lexsort((ids, exact))[0]]
+        planning_stats.count(self.stats, "distance_evaluations", k + len(exact))
+        return best // 2, bool(best % 2)
+
+def order_greedy(start_point, line_segments, stats = None):
+    """
+        Orders *line_segments* by repeatedly flying to the nearest end point of
+        any line segment that hasn't been seen, starting from *start_point*.
+        Returns a list of (index, reverse) pairs, where *reverse* is True if
+        the line segment is flown from its end to its start. The distances
+        evaluated are counted in *stats*, if given.
+    """
+    if len(line_segments) == 0:
+        return []
+
+    index = EndpointIndex(line_segments, stats)
+    order = []
+    point = start_point
+    while index.remaining:
+        nearest, reverse = index.nearest(point)
+        order.append((nearest, reverse))
+        index.remove(nearest)
+        point = index.points[2*nearest + (not reverse)]
+
+    return order
+
+def connect_ordered(start_point, line_segments, order):
+    """
+        Returns the Path that starts at *start_point* and flies each of the
+        line segments in *order*
+    """
+    line_segments = numpy.asarray(line_segments, dtype=float).reshape(-1, 2, 2)
+    indices, reverse = numpy.array(order, dtype=int).reshape(-1, 2).T
+
+    # Flying a line segment in reverse takes its end point first
+    ends = numpy.column_stack([reverse, 1 - reverse])
+    points = line_segments[indices[:, None], ends].reshape(-1, 2)
+    return Path(numpy.vstack([numpy.reshape(start_point, (1, 2)), points]))
+
+def decompose_cells(line_segments):
+    """
+        Splits vertical *line_segments* into boustrophedon cells: runs of
+        line segments in consecutive columns, one per column, where each line
+        segment only overlaps its neighbours in the run. A new cell starts
+        wherever the search area splits or merges between two columns.
+        Returns a list of cells, each a list of line segment indices ordered
+        by column.
+    """
+    if len(line_segments) == 0:
+        return []
+
+    points = numpy.asarray(line_segments, dtype=float).reshape(-1, 2, 2)
+    xs = points[:, 0, 0]
+    lows = points[:, :, 1].min(axis=1)
+    highs = points[:, :, 1].max(axis=1)
+
+    order = numpy.lexsort((lows, xs))
+    sorted_xs = xs[order]
+    column_starts = numpy.flatnonzero(sorted_xs[1:] != sorted_xs[:-1]) + 1
+    columns = numpy.split(order, column_starts)
+
+    def overlaps(column, other_column):
+        """
+            Returns, for each line segment in *column*, the line segments
+            of *other_column* that it overlaps. The line segments of a
+            column don't overlap, so sorted by their lows, their highs are
+            sorted too, and the overlapping ones are a run found by
+            searchsorted.
+        """
+        other_column = numpy.asarray(other_column, dtype=int)
+        starts = numpy.searchsorted(highs[other_column], lows[column], side="left")
+        stops = numpy.searchsorted(lows[other_column], highs[column], side="right")
+        return [list(other_column[start:stop]) for start, stop in zip(starts, stops)]
+
+    cells = []
+    open_cells = {}
+    for previous, column in zip([[]] + columns[:-1], columns):
+        forward = dict(zip(previous, overlaps(previous, column)))
+        backward = overlaps(column, previous)
+        next_open_cells = {}
+        for index, neighbours in zip(column, backward):
+            if len(neighbours) == 1 and len(forward[neighbours[0]]) == 1:
+                cell = open_cells[neighbours[0]]
+            else:
+                cell = []
+                cells.append(cell)
+            cell.append(index)
+            next_open_cells[index] = cell
+        open_cells = next_open_cells
+
+    return [[int(index) for index in cell] for cell in cells]
+
+class CellEntryIndex:
+    """
+        Nearest neighbour index over the entries of boustrophedon cells,
+        where entries 4*k to 4*k + 3 enter cell k. Cells can be removed
+        once they have been swept.
+    """
+
+    def __init__(self, entries):
+        self.__tree = LazyTree(entries)
+        self.entries = self.__tree.points
+
+    def remove_cell(self, cell):
+        self.__tree.remove(slice(4*cell, 4*cell + 4))
+
+    def nearest_in_other_cells(self, points, cells):
+        """
+            Returns, for each of *points*, the distance to the nearest entry
+            of a cell that is left other than the matching one of *cells*,
+            and that entry, or inf and -1 if there is none
+        """
+        points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        nearest = numpy.empty(len(points), dtype=int)
+        nearest.fill(-1)
+        pending = numpy.arange(len(points))
+
+        # A point's own cell has four entries, so the fifth nearest is
+        # usually in another cell
+        k = 5
+        while len(pending):
+            k = min(k, self.__tree.size())
+            ids = self.__tree.query(points[pending], k)[1].reshape(-1, k)
+            valid = self.__tree.alive[ids] & (ids // 4 != cells[pending][:, None])
+            found = valid.any(axis=1)
+            rows = numpy.flatnonzero(found)
+            nearest[pending[rows]] = ids[rows, numpy.argmax(valid[rows], axis=1)]
+            if k == self.__tree.size():
+                break
+            pending = pending[~found]
+            k *= 2
+
+        # Distances are computed as the distance matrix of the cells would
+        distances = numpy.empty(len(points))
+        distances.fill(numpy.inf)
+        has_nearest = nearest >= 0
+        distances[has_nearest] = numpy.hypot(
+                *(points[has_nearest] - self.entries[nearest[has_nearest]]).T)
+        return distances, nearest
+
+def _cell_corners(cells, lows, highs):
+    """
+        Returns the corners that each of *cells* can be entered at, the
+        corners that it is then left at, and for each entry, the entry that
+        flies the cell the other way round. Entry 4*k + 2*from_last +
+        from_top enters cell k at that corner. *lows* and *highs* are the
+        bottom and top end points of the line segments.
+    """
+    entries, exits, reversed_entries = [], [], []
+    for k, cell in enumerate(cells):
+        leaves_on_same_side = len(cell) % 2 == 0
+        for from_last, (first, last) in enumerate(((cell[0], cell[-1]),
+                                                   (cell[-1], cell[0]))):
+            entries += [lows[first], highs[first]]
+            exits += [lows[last], highs[last]] if leaves_on_same_side else \
+                     [highs[last], lows[last]]
+            for from_top in (0, 1):
+                to_top = from_top if leaves_on_same_side else 1 - from_top
+                reversed_entries.append(4*k + 2*(1 - from_last) + to_top)
+    return numpy.array(entries), numpy.array(exits), numpy.array(reversed_entries)
+
+def _tour_cells(start_point, entries, exits, stats = None):
+    """
+        Returns the entries that visit every cell once, choosing each next
+        cell and corner by the transit to that corner plus the transit from
+        the corner it leaves at to the nearest remaining cell
+    """
+    entry_cells = numpy.arange(len(entries)) // 4
+    index = CellEntryIndex(entries)
+    onward, onward_entries = index.nearest_in_other_cells(exits, entry_cells)
+    planning_stats.count(stats, "distance_evaluations", len(onward))
+
+    tour = []
+    point = numpy.asarray(start_point, dtype=float)
+    alive = numpy.ones(len(entries), dtype=bool)
+    while alive.any():
+        candidates = numpy.flatnonzero(alive)
+        cost = numpy.hypot(*(entries[candidates] - point).T)
+        planning_stats.count(stats, "distance_evaluations", len(candidates))
+        if len(candidates) > 4:
+            cost += onward[candidates]
+        entry = candidates[numpy.argmin(cost)]
+        tour.append(entry)
+        alive[entry - entry % 4:entry - entry % 4 + 4] = False
+        point = exits[entry]
+
+        # Find a new nearest cell for the corners whose nearest cell was swept
+        index.remove_cell(entry // 4)
+        stale = numpy.flatnonzero(alive & (onward_entries // 4 == entry // 4))
+        if len(stale):
+            onward[stale], onward_entries[stale] = index.nearest_in_other_cells(
+                    exits[stale], entry_cells[stale])
+            planning_stats.count(stats, "distance_evaluations", len(stale))
+
+    return numpy.array(tour)
+
+def _choose_corners(start_point, entries, exits, tour):
+    """
+        Returns *tour* with each cell entered at the corner that makes the
+        transits shortest, keeping the order of the cells
+    """
+    corners = tour[:, None] - tour[:, None] % 4 + numpy.arange(4)
+    cost = numpy.hypot(*(entries[corners[0]] - start_point).T)
+    choices = []
+    for previous, following in zip(corners, corners[1:]):
+        legs = numpy.hypot(*(entries[following][None, :] -
+                             exits[previous][:, None]).T).T
+        total = cost[:, None] + legs
+        choices.append(numpy.argmin(total, axis=0))
+        cost = total.min(axis=0)
+
+    corner = numpy.argmin(cost)
+    chosen = [corner]
+    for choice in reversed(choices):
+        corner = choice[corner]
+        chosen.append(corner)
+    return corners[numpy.arange(len(tour)), chosen[::-1]]
+
+def _improve_tour(start_point, entries, exits, reversed_entries, tour,
+                  stats = None):
+    """
+        Shortens *tour* by choosing the corners of its cells, and moving
+        whole cells with improve_order as if each were a line segment from
+        its entry to its exit, until neither helps
+    """
+    start_point = numpy.asarray(start_point, dtype=float)
+    while True:
+        tour = _choose_corners(start_point, entries, exits, tour)
+        cells_as_segments = numpy.stack([entries[tour], exits[tour]], axis=1)
+        order, improvement = improve_order(start_point, cells_as_segments,
+                [(i, False) for i in range(len(tour))], None, stats = stats)
+        if improvement <= EPSILON:
+            return tour
+        tour = numpy.array([reversed_entries[tour[i]] if reverse else tour[i]
+                            for i, reverse in order])
+
+def _split_at_start(start_point, line_segments, cells):
+    """
+        Returns *cells* with the cell that holds the end point nearest to
+        *start_point* split before and after its column, so that the plane
+        can start the search there and sweep each side in turn, or None if
+        that cell has a single column
+    """
+    points = numpy.asarray(line_segments, dtype=float).reshape(-1, 2)
+    nearest = numpy.argmin(numpy.hypot(*(points - start_point).T)) // 2
+    for k, cell in enumerate(cells):
+        if nearest in cell and len(cell) > 1:
+            column = cell.index(nearest)
+            parts = [cell[:column], cell[column:column + 1], cell[column + 1:]]
+            return cells[:k] + [part for part in parts if part] + cells[k + 1:]
+    return None
+
+def order_boustrophedon(start_point, line_segments, stats = None):
+    """
+        Orders vertical *line_segments* by sweeping the boustrophedon cells of
+        the search area one at a time, alternating the direction of travel
+        on each column. Returns a list of (index, reverse) pairs, like
+        order_greedy.
+
+        Each cell can be entered at any of its four corners, which fixes the
+        corner it is left from. The cells are first toured by choosing each
+        next cell and corner to minimise the transit to that corner plus the
+        transit from the corner it leaves at to the nearest remaining cell.
+        The tour is then shortened with 2-opt and Or-opt moves of whole
+        cells, and the corners are chosen again for the new order of cells.
+
+        The cell nearest to *start_point* is also tried split at the column
+        nearest to it, as starting mid-cell and sweeping each side in turn
+        can be shorter, and the split is kept if the tour is shorter. The
+        distances evaluated are counted in *stats*, if given.
+    """
+    cells = decompose_cells(line_segments)
+    if not cells:
+        return []
+
+    points = numpy.asarray(line_segments, dtype=float).reshape(-1, 2, 2)
+    starts_low = points[:, 0, 1] <= points[:, 1, 1]
+    lows = numpy.where(starts_low[:, None], points[:, 0], points[:, 1])
+    highs = numpy.where(starts_low[:, None], points[:, 1], points[:, 0])
+
+    def sweep(cells, tour):
+        """
+            Returns the order that sweeps *cells* as *tour* enters them
+        """
+        order = []
+        for entry in tour:
+            cell = cells[entry // 4]
+            going_up = entry % 2 == 0
+            for segment in (cell[::-1] if entry % 4 >= 2 else cell):
+                order.append((segment, bool(going_up != starts_low[segment])))
+                going_up = not going_up
+        return order
+
+    best = None
+    for candidate in (cells, _split_at_start(start_point, line_segments, cells)):
+        if candidate is None:
+            continue
+        entries, exits, reversed_entries = _cell_corners(candidate, lows, highs)
+        tour = _improve_tour(start_point, entries, exits, reversed_entries,
+                             _tour_cells(start_point, entries, exits, stats), stats)
+        order = sweep(candidate, tour)
+        length = path_length(connect_ordered(start_point, line_segments, order))
+        if best is None or length < best[0] - EPSILON:
+            best = length, order
+
+    return best[1]
+
+# Above this many end points, distances are computed from the coordinates as
+# they are needed instead of being looked up in a precomputed matrix
+MAX_DISTANCE_MATRIX_POINTS = 3000
+
+class EndpointDistances:
+    """
+        Distances between the start point (node 0) and the end points of a
+        list of line segments. Line segment i starts at node 2*i + 1 and ends
+        at node 2*i + 2. If *stats* is given, every distance asked for is
+        counted in its "distance_evaluations".
+    """
+
+    def __init__(self, start_point, line_segments, stats = None):
+        self.points = numpy.vstack([numpy.reshape(start_point, (1, 2)),
+            numpy.asarray(line_segments, dtype=float).reshape(-1, 2)])
+        if len(self.points) <= MAX_DISTANCE_MATRIX_POINTS:
+            differences = self.points[:, None] - self.points[None, :]
+            self.matrix = numpy.hypot(differences[..., 0], differences[..., 1])
+        else:
+            self.matrix = None
+        self.stats = stats
+
+    def __call__(self, nodes, other_nodes):
+        """
+            Returns the distances between *nodes* and *other_nodes*,
+            broadcasting them against each other
+        """
+        if self.matrix is not None:
+            result = self.matrix[nodes, other_nodes]
+        else:
+            differences = self.points[nodes] - self.points[other_nodes]
+            result = numpy.hypot(differences[..., 0], differences[..., 1])
+        planning_stats.count(self.stats, "distance_evaluations", numpy.size(result))
+        return result
+
+def transit_length(start_point, line_segments, order, distances = None):
+    """
+        Returns the total length of the legs between line segments (and from
+        *start_point* to the first one) when they are flown in *order*
+    """
+    if not order:
+        return 0.0
+    if distances is None:
+        distances = EndpointDistances(start_point, line_segments)
+
+    indices, reverse = numpy.array(order, dtype=int).T
+    entries = 1 + 2*indices + reverse
+    exits = 2 + 2*indices - reverse
+    return float(distances(numpy.r_[0, exits[:-1]], entries).sum())
+
+def improve_order(start_point, line_segments, order, time_budget,
+                  callback = None, should_stop = None, stats = None):
+    """
+        Improves *order* with 2-opt and Or-opt moves until no move shortens
+        the path or *time_budget* seconds have passed (None for no limit).
+        Line segments are never split, but may be flown in either direction.
+        Returns the new order and how much shorter the path became.
+
+        After every pass over the order that shortened the path, the order
+        so far and its improvement are passed to *callback*. If
+        *should_stop* is given, the improvement stops as soon as it returns
+        True, as if the time budget had run out. The distances evaluated
+        and the moves made are counted in *stats*, if given.
+
+        2-opt reverses a run of line segments, flipping the direction of
+        each. Or-opt moves a run of up to three line segments elsewhere in
+        the order, optionally reversed. Every move only changes the legs at
+        its ends, so its effect is evaluated from those legs alone, for all
+        positions at once.
+    """
+    if time_budget is None:
+        deadline = float("inf")
+    else:
+        deadline = time.time() + time_budget
+    if len(order) < 2:
+        return list(order), 0.0
+
+    distances = EndpointDistances(start_point, line_segments, stats)
+    sequence, reverse = numpy.array(order, dtype=int).T
+    initial_length = transit_length(start_point, line_segments, order, distances)
+
+    def entries_and_exits():
+        return 1 + 2*sequence + reverse, 2 + 2*sequence - reverse
+
+    def try_2opt(i):
+        """
+            Reverses the best run starting at *i*, returns True if it
+            shortened the path
+        """
+        entries, exits = entries_and_exits()
+        before = exits[i - 1] if i else 0
+        j = numpy.arange(i, len(sequence))
+        after = numpy.append(entries[i + 1:], 0)
+        at_end = j == len(sequence) - 1
+
+        delta = distances(before, exits[j]) - distances(before, entries[i]) + \
+                numpy.where(at_end, 0, distances(entries[i], after) -
+                                       distances(exits[j], after))
+        best = numpy.argmin(delta)
+        if delta[best] >= -EPSILON:
+            return False
+
+        stop = i + best + 1
+        planning_stats.count(stats, "two_opt_moves")
+        sequence[i:stop] = sequence[i:stop][::-1]
+        reverse[i:stop] = 1 - reverse[i:stop][::-1]
+        return True
+
+    def try_or_opt(i, length):
+        """
+            Moves the run of *length* line segments starting at *i* to its
+            best position, returns True if it shortened the path
+        """
+        entries, exits = entries_and_exits()
+        stop = i + length
+        before = exits[i - 1] if i else 0
+        first, last = entries[i], exits[stop - 1]
+        if stop < len(sequence):
+            removed = distances(before, first) + distances(last, entries[stop]) - \
+                      distances(before, entries[stop])
+        else:
+            removed = distances(before, first)
+
+        # Legs (u, v) of the order without the run that it could be put into;
+        # v is -1 where the run would be appended at the end
+        rest = numpy.concatenate([numpy.arange(i), numpy.arange(stop, len(sequence))])
+        u = numpy.concatenate([[0], exits[rest]])
+        v = numpy.append(entries[rest], -1)
+        at_end = v == -1
+        v = numpy.where(at_end, 0, v)
+        old_leg = numpy.where(at_end, 0, distances(u, v))
+
+        forward = distances(u, first) - old_leg + \
+                  numpy.where(at_end, 0, distances(last, v))
+        backward = distances(u, last) - old_leg + \
+                   numpy.where(at_end, 0, distances(first, v))
+        # Putting the run back where it was, unreversed, changes nothing
+        forward[i] = numpy.inf
+
+        position = numpy.argmin(numpy.minimum(forward, backward))
+        flip = backward[position] < forward[position]
+        if min(forward[position], backward[position]) - removed >= -EPSILON:
+            return False
+
+        planning_stats.count(stats, "or_opt_moves")
+        run = sequence[i:stop], reverse[i:stop]
+        if flip:
+            run = run[0][::-1], 1 - run[1][::-1]
+        rest_sequence, rest_reverse = sequence[rest], reverse[rest]
+        sequence[:] = numpy.concatenate([rest_sequence[:position], run[0],
+                                         rest_sequence[position:]])
+        reverse[:] = numpy.concatenate([rest_reverse[:position], run[1],
+                                        rest_reverse[position:]])
+        return True
+
+    def current_order():
+        order = [(int(index), bool(flipped)) for index, flipped in
+                 zip(sequence, reverse)]
+        return order, initial_length - transit_length(start_point,
+                line_segments, order, distances)
+
+    improved = True
+    stopped = False
+    while improved and not stopped:
+        improved = False
+        for i in range(len(sequence)):
+            if time.time() > deadline or \
+               (should_stop is not None and should_stop()):
+                stopped = True
+                break
+            if try_2opt(i):
+                improved = True
+            for length in (1, 2, 3):
+                if i + length <= len(sequence) and try_or_opt(i, length):
+                    improved = True
+
+        if improved and callback is not None:
+            callback(*current_order())
+
+    return current_order()
@@ -0,0 +1,106 @@
+import batch_planner
+
+from pathfinder import Pathfinder
+from test_helpers import assert_points_match
+
+class PicklesOnce:
+    """
+        Can be sent to a worker process, but not back
+    """
+
+    def __getstate__(self):
+        if getattr(self, "unpickled", False):
+            raise TypeError("Can only be pickled once")
+        return {}
+
+    def __setstate__(self, state):
+        self.unpickled = True
+
+class TestBatchPlanner:
+
+    def test_sweep_wind_angles(self):
+        from batch_planner import sweep_wind_angles
+
+        plane_location = 0, 0
+        searcharea = [(0, 0), (1000, 0), (1000, 200), (0, 200)]
+        options = { "path_width": 50, "overshoot_distance": 10 }
+        angles = [0, 45, 90]
+
+        def test_fewest_turns_along_long_side():
+            result, costs = sweep_wind_angles(plane_location, searcharea,
+                    searcharea, options, angles, "turns", processes = 1)
+            assert [angle for angle, cost in costs] == angles
+            assert result.options["wind_angle_degrees"] == 90
+            assert result.index == 2
+            assert min(cost for angle, cost in costs) == costs[2][1]
+
+        def test_pool_matches_serial():
+            serial = sweep_wind_angles(plane_location, searcharea, searcharea,
+                    options, angles, processes = 1)
+            pooled = sweep_wind_angles(plane_location, searcharea, searcharea,
+                    options, angles, processes = 2)
+            assert serial[1] == pooled[1]
+            assert serial[0].options == pooled[0].options
+            assert serial[0].segment_order == pooled[0].segment_order
+            assert_points_match(serial[0].path, pooled[0].path)
+
+        test_fewest_turns_along_long_side()
+        test_pool_matches_serial()
+
+    def test_plan_missions(self):
+        from batch_planner import plan_missions, iter_missions
+
+        square = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+        triangle = [(0, 0), (1000, 0), (500, 500)]
+        jobs = [((1, 1), square, square),
+                ((1, 1), triangle, triangle, { "wind_angle_degrees": 30 }),
+                ((1, 1), square, square, { "ordering": "unknown" }),
+                ((1, 1), square, square, { "path_width": 100 })]
+
+        def assert_results_valid(results):
+            assert [result.index for result in results] == range(len(jobs))
+            assert [result.succeeded() for result in results] == \
+                   [True, True, False, True]
+            assert "Unknown ordering" in results[2].error
+            assert results[2].path is None
+            for result, job in zip(results, jobs):
+                if result.succeeded():
+                    finder = Pathfinder(*job)
+                    assert_points_match(finder.get_path(), result.path)
+                    assert result.options == finder.get_options()
+                    assert result.segment_order == finder.get_segment_order()
+
+        def test_serial():
+            assert_results_valid(plan_missions(jobs, processes = 1))
+
+        def test_pool():
+            assert_results_valid(plan_missions(jobs, processes = 2,
+                                               chunksize = 1))
+
+        def test_stream():
+            results = list(iter_missions(jobs, processes = 2))
+            assert_results_valid(sorted(results, key = lambda r: r.index))
+
+        def test_pool_with_no_fly_zones():
+            # The no-fly zones of each plan are sent back from the workers
+            zone = [(400, 400), (600, 400), (600, 600), (400, 600)]
+            job = ((1, 1), square, square, { "no_fly_zones": [zone] })
+            results = plan_missions([job, job], processes = 2, chunksize = 1)
+            assert [result.succeeded() for result in results] == [True, True]
+            expected = Pathfinder(*job).get_path()
+            for result in results:
+                assert_points_match(expected, result.path)
+
+        def test_unpicklable_result():
+            # A job whose result can't be sent back only fails on its own
+            bad_job = ((1, 1), square, square, { "wp_altitude": PicklesOnce() })
+            results = plan_missions([bad_job, jobs[0]], processes = 2,
+                                    chunksize = 1)
+            assert [result.succeeded() for result in results] == [False, True]
+            assert "Can only be pickled once" in results[0].error
+
+        test_serial()
+        test_pool()
+        test_stream()
+        test_pool_with_no_fly_zones()
+        test_unpicklable_result()
@@ -0,0 +1,51 @@
+import shapely.geometry
+
+from benchmark import generate_polygon, compare, POLYGON_KINDS
+from test_helpers import assert_should_raise_exception
+
+class TestBenchmark:
+
+    def test_generate_polygon(self):
+        def test_valid():
+            for kind in POLYGON_KINDS:
+                for seed in range(3):
+                    polygon = shapely.geometry.Polygon(generate_polygon(kind, seed))
+                    assert polygon.is_valid
+                    assert polygon.area > 0
+
+        def test_seeded():
+            assert generate_polygon("concave", 1) == generate_polygon("concave", 1)
+            assert generate_polygon("concave", 1) != generate_polygon("concave", 2)
+
+        def test_convex():
+            polygon = shapely.geometry.Polygon(generate_polygon("convex", 0))
+            assert abs(polygon.area - polygon.convex_hull.area) < 1e-6
+
+        def test_unknown_kind():
+            assert_should_raise_exception(lambda: generate_polygon("round", 0))
+
+        test_valid()
+        test_seeded()
+        test_convex()
+        test_unknown_kind()
+
+    def test_compare(self):
+        def results(order_seconds, qgc_seconds, start_rss_kb, peak_rss_kb):
+            return { "cases": [{
+                "name": "star-0-w30",
+                "stages": { "order": order_seconds },
+                "exporters": { "qgc": qgc_seconds },
+                "start_rss_kb": start_rss_kb,
+                "peak_rss_kb": peak_rss_kb
+            }] }
+
+        baseline = results(0.1, 0.001, 50000, 60000)
+        assert compare(results(0.11, 0.004, 50000, 61000), baseline) == []
+        assert compare(results(0.2, 0.001, 50000, 80000), baseline) == [
+            ("star-0-w30", "stages.order", 0.1, 0.2),
+            ("star-0-w30", "added_rss_kb", 10000, 30000)]
+
+        # A worker forked from a bigger process starts with a bigger peak
+        assert compare(results(0.1, 0.001, 90000, 100000), baseline) == []
+        assert compare(results(0.1, 0.001, 0, 300), results(0.1, 0.001, 0, 100)) == []
+        assert compare({ "cases": [] }, baseline) == []
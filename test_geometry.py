@@ -326,3 +326,246 @@ class TestGeometry:
 
         test_valid_results_for_vertical()
         test_should_return_segment_if_not_vertical()
+
+    def test_calculate_scanline_crossings(self):
+        from geometry_operations import calculate_scanline_crossings
+
+        def test_vertex_reported_once():
+            boundaries = [(0, 0), (100, 0), (50, 50), (100, 100), (0, 100)]
+            line_ids, ys = calculate_scanline_crossings([50, 75], boundaries)
+            assert list(line_ids) == [0, 0, 0, 1, 1, 1, 1]
+            assert list(ys) == [0, 50, 100, 0, 25, 75, 100]
+
+        def test_edge_on_line():
+            boundaries = [(0, 0), (100, 0), (100, 100), (0, 100)]
+            line_ids, ys = calculate_scanline_crossings([0, 150], boundaries)
+            assert list(line_ids) == [0, 0]
+            assert list(ys) == [0, 100]
+
+        test_vertex_reported_once()
+        test_edge_on_line()
+
+    def test_calculate_line_segments(self):
+        from geometry_operations import calculate_line_segments, \
+                                        calculate_line_segments_thru, \
+                                        get_min_x, get_max_x, pad_vertical
+        import numpy
+
+        def calculate_line_segments_with_shapely(boundaries, dx, padding):
+            xs = numpy.arange(get_min_x(boundaries), get_max_x(boundaries), dx)
+            return [pad_vertical(line_segment, padding) for x in xs
+                    for line_segment in calculate_line_segments_thru(x, boundaries)]
+
+        def assert_matches_shapely(boundaries, dx, padding):
+            expected = calculate_line_segments_with_shapely(boundaries, dx,
+                                                            padding)
+            actual = calculate_line_segments(boundaries, dx, padding)
+            assert len(expected) == len(actual)
+            for expected_segment, actual_segment in zip(expected, actual):
+                assert_points_match(expected_segment, actual_segment)
+
+        def test_concave():
+            boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+            assert_matches_shapely(boundaries, 61, 10)
+            assert_matches_shapely(boundaries, 250, 0)
+
+        def test_collinear_edges():
+            boundaries = [(40, 25), (85, 20), (100, 55), (80, 55), (80, 80),
+                          (50, 85), (25, 70), (25, 60), (25, 55)]
+            assert_matches_shapely(boundaries, 5, 3)
+
+        def test_closed_polygon():
+            boundaries = [(500, 0), (0, 500), (-500, 0), (0, -500), (500, 0)]
+            assert_matches_shapely(boundaries, 100, -5)
+
+        test_concave()
+        test_collinear_edges()
+        test_closed_polygon()
+
+    def test_exclusions(self):
+        from geometry_operations import calculate_ring_intervals, \
+                                        subtract_intervals, calculate_line_segments
+        import numpy
+
+        def test_ring_intervals():
+            # The line through the tip of the triangle crosses it twice
+            rings = [[(0, 0), (10, 0), (5, 10)], [(4, 8), (6, 8), (6, 20), (4, 20)]]
+            line_ids, bottoms, tops = calculate_ring_intervals([5, 10, 20], rings)
+            assert list(line_ids) == [0, 0]
+            assert list(bottoms) == [0, 8]
+            assert list(tops) == [10, 20]
+
+        def test_subtract():
+            intervals = (numpy.array([0, 0, 1]), numpy.array([0.0, 20, 0]),
+                         numpy.array([10.0, 30, 10]))
+            others = (numpy.array([0, 0, 0, 1]), numpy.array([2.0, 4, 20, 3]),
+                      numpy.array([5.0, 6, 25, 3]))
+            line_ids, bottoms, tops = subtract_intervals(intervals, others)
+            assert list(line_ids) == [0, 0, 0, 1, 1]
+            assert list(bottoms) == [0, 6, 25, 0, 3]
+            assert list(tops) == [2, 10, 30, 3, 10]
+
+        def test_holes_and_no_fly_zones():
+            boundaries = [(0, 0), (100, 0), (100, 100), (0, 100)]
+            square = [(40, 40), (60, 40), (60, 60), (40, 60)]
+            line_segments = calculate_line_segments(boundaries, 50, 5, 50,
+                                                    holes = [square])
+            assert_points_match([(50, -5), (50, 45), (50, 55), (50, 105)],
+                                line_segments.reshape(-1, 2))
+
+            # Padding stops at the no-fly zone
+            line_segments = calculate_line_segments(boundaries, 50, 5, 50,
+                    no_fly_zones = [[(45, 42), (55, 42), (55, 60), (45, 60)]])
+            assert_points_match([(50, -5), (50, 42), (50, 60), (50, 105)],
+                                line_segments.reshape(-1, 2))
+
+        test_ring_intervals()
+        test_subtract()
+        test_holes_and_no_fly_zones()
+
+    def test_iter_line_segment_bands(self):
+        from geometry_operations import iter_line_segment_bands,\
+                                        calculate_line_segments
+        import numpy
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+
+        def test_bands_make_up_line_segments():
+            for offset in [0, 7.5]:
+                expected = calculate_line_segments(boundaries, 30, 5, offset)
+                bands = list(iter_line_segment_bands(boundaries, 30, 5, offset, 4))
+                assert len(bands) == 9
+                assert numpy.array_equal(numpy.concatenate(bands), expected)
+
+        def test_no_lines():
+            assert list(iter_line_segment_bands([(0, 0), (0, 10)], 30, 5)) == []
+
+        test_bands_make_up_line_segments()
+        test_no_lines()
+
+    def test_path_length(self):
+        from geometry_operations import path_length
+
+        assert path_length([]) == 0
+        assert path_length([(1, 1)]) == 0
+        assert path_length([(0, 0), (3, 4), (3, 4), (3, 0)]) == 9
+
+    def test_count_turns(self):
+        from geometry_operations import count_turns
+
+        def test_straight():
+            assert count_turns([(0, 0), (0, 5), (0, 5), (0, 10)]) == 0
+
+        def test_turns():
+            path = [(0, 0), (0, 10), (1, 10), (1, 0), (1, -5), (1, 0)]
+            assert count_turns(path) == 3
+
+        test_straight()
+        test_turns()
+
+    def test_optimize_scanline_offset(self):
+        from geometry_operations import optimize_scanline_offset, \
+                                        calculate_line_segments
+        import math
+
+        def test_drops_nearly_empty_pass():
+            # With no offset, the last pass only covers the tip at x = 101
+            boundaries = [(0, 0), (101, 50), (0, 100)]
+            offset = optimize_scanline_offset(boundaries, 25, 0)
+            assert 0 < offset < 25
+            assert len(calculate_line_segments(boundaries, 25, 0, offset)) == 4
+            assert len(calculate_line_segments(boundaries, 25, 0)) == 5
+
+        def test_shortest():
+            def length(offset):
+                return sum(top[1] - bottom[1] for bottom, top in
+                           calculate_line_segments(boundaries, 25, 10, offset))
+
+            boundaries = [(0, 0), (101, 50), (0, 100)]
+            offset = optimize_scanline_offset(boundaries, 25, 10, "length")
+            assert all(length(offset) <= length(other) for other in range(25))
+
+        def test_band_size():
+            # A star has offsets whose lengths only differ by rounding
+            radii = [1000, 500] * 6
+            boundaries = [(radius * math.cos(math.pi * i / 6),
+                           radius * math.sin(math.pi * i / 6))
+                          for i, radius in enumerate(radii)]
+            for criterion in ("segments", "length"):
+                offset = optimize_scanline_offset(boundaries, 61, 10, criterion)
+                for band_size in (1, 5, 1000):
+                    assert optimize_scanline_offset(boundaries, 61, 10, criterion,
+                                                    band_size = band_size) == offset
+
+        def test_unknown_criterion():
+            assert_should_raise_exception(lambda: optimize_scanline_offset(
+                [(0, 0), (1, 0), (0, 1)], 0.5, 0, "turns"))
+
+        test_drops_nearly_empty_pass()
+        test_shortest()
+        test_band_size()
+        test_unknown_criterion()
+
+    def test_path(self):
+        from geometry_operations import Path
+        import numpy
+
+        def test_points():
+            path = Path([(0, 0), (1, 2), (3, 4)])
+            assert path.points.dtype == numpy.float64
+            assert path.points.flags["C_CONTIGUOUS"]
+            assert len(path) == 3
+            assert list(path[1]) == [1, 2]
+            assert isinstance(path[1:], Path)
+            assert_points_match([(1, 2), (3, 4)], path[1:])
+
+        def test_legs():
+            path = Path([(0, 0), (1, 2), (3, 4)])
+            legs = path.get_legs()
+            assert legs.shape == (2, 2, 2)
+            assert legs.tolist() == [[[0, 0], [1, 2]], [[1, 2], [3, 4]]]
+            assert numpy.may_share_memory(legs, path.points)
+            assert Path([(0, 0)]).get_legs().shape == (0, 2, 2)
+
+        def test_remove_sequential_duplicates():
+            path = Path([(0, 0), (0, 0), (1, 1), (0, 0), (0, 0), (0, 0)])
+            expected = [(0, 0), (1, 1), (0, 0)]
+            assert path.remove_sequential_duplicates().points.tolist() == \
+                   [list(point) for point in expected]
+
+        test_points()
+        test_legs()
+        test_remove_sequential_duplicates()
+
+    def test_normalize_and_pad(self):
+        from geometry_operations import normalize_and_pad
+        path = [(0, 0), (5, 10)]
+        boundaries = [(-5, 0), (10, 0), (10, 20)]
+        path, boundaries = normalize_and_pad(path, boundaries, (150, 100), 10)
+        assert_points_match([(60, 10), (110, 60)], path)
+        assert_points_match([(10, 10), (160, 10), (160, 110)], boundaries)
+
+    def test_densify_vertical_legs(self):
+        from geometry_operations import densify_vertical_legs,\
+                                        partition_line_segment_if_vertical
+        import numpy
+
+        def test_matches_partition_line_segment_if_vertical():
+            path = [(0, 0), (0, 100), (50, 100), (50, -7.5), (50, -7.5),
+                    (50, 3), (80, 200)]
+            for distance in [2.3, 7, 150]:
+                waypoints, leg_ends = densify_vertical_legs(path, distance)
+                expected = []
+                for leg in zip(path, path[1:]):
+                    expected.extend(partition_line_segment_if_vertical(leg, distance))
+                assert numpy.array_equal(waypoints.points,
+                                         numpy.array(expected, dtype = float))
+                assert [tuple(point) for point in waypoints[leg_ends]] == \
+                       [tuple(map(float, point)) for point in path[1:]]
+
+        def test_single_point():
+            waypoints, leg_ends = densify_vertical_legs([(0, 0)], 5)
+            assert len(waypoints) == 0
+            assert len(leg_ends) == 0
+
+        test_matches_partition_line_segment_if_vertical()
+        test_single_point()
@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+
+from image_generator import ImageGenerator, place_labels
+from pathfinder import Pathfinder
+
+class TestImageGenerator:
+
+    def test_place_labels(self):
+        def test_no_overlaps():
+            positions = [(0, 0), (5, 5), (30, 0), (25, 10), (0, 20), (60, 60)]
+            sizes = [(30, 20)] * len(positions)
+            assert place_labels(positions, sizes) == [0, 2, 4, 5]
+
+        def test_far_apart():
+            positions = [(x * 100, 0) for x in range(10)]
+            assert place_labels(positions, [(90, 10)] * 10) == range(10)
+
+        def test_empty():
+            assert place_labels([], []) == []
+
+        test_no_overlaps()
+        test_far_apart()
+        test_empty()
+
+    def test_create_image(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30, "path_width": 10 })
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "path.jpg")
+            ImageGenerator(finder).create_image(filename, (400, 400))
+            assert os.path.getsize(filename) > 0
+        finally:
+            shutil.rmtree(directory)
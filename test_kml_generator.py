@@ -0,0 +1,75 @@
+import zipfile
+from StringIO import StringIO
+from xml.etree import ElementTree
+
+from pathfinder import Pathfinder
+from kml_generator import KMLGenerator
+from test_helpers import assert_should_raise_exception
+
+KML = "{http://www.opengis.net/kml/2.2}"
+
+class TestKMLGenerator:
+
+    def test_export_kml(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1.5, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30, "path_width": 20 })
+        path = finder.get_path()
+
+        def export(**kwargs):
+            output = StringIO()
+            KMLGenerator(finder).export_kml(output, **kwargs)
+            return output.getvalue()
+
+        def parse(text):
+            return ElementTree.fromstring(text)
+
+        def line_coordinates(kml):
+            line = kml.find(".//%sLineString/%scoordinates" % (KML, KML))
+            return line.text.split()
+
+        def test_multigeometry():
+            kml = parse(export())
+            assert len(line_coordinates(kml)) == len(path)
+            points = kml.findall(".//%sMultiGeometry/%sPoint" % (KML, KML))
+            assert len(points) == len(path)
+            assert len(kml.findall(".//%sPlacemark" % KML)) == 4
+
+        def test_placemarks():
+            kml = parse(export(markers = "placemarks", marker_spacing = 10))
+            names = [name.text for name in kml.findall(".//%sPlacemark/%sname" % (KML, KML))]
+            expected = ["WP %i" % index for index in range(0, len(path), 10)]
+            if (len(path) - 1) % 10:
+                expected.append("WP %i" % (len(path) - 1))
+            assert names[3:] == expected
+
+        def test_simplified():
+            full = line_coordinates(parse(export()))
+            simplified = line_coordinates(parse(export(tolerance = 1, markers = None)))
+            assert 1 < len(simplified) < len(full)
+            assert simplified[0] == full[0] and simplified[-1] == full[-1]
+
+        def test_streaming():
+            streamed = list(finder.iter_path())
+            kml = parse(export(streaming = True))
+            assert len(line_coordinates(kml)) == len(streamed)
+            points = kml.findall(".//%sMultiGeometry/%sPoint" % (KML, KML))
+            assert len(points) == len(streamed)
+            assert export(streaming = True, markers = "placemarks") == \
+                   export(markers = "placemarks")
+
+        def test_kmz():
+            output = StringIO()
+            KMLGenerator(finder).export_kml(output, kmz = True)
+            archive = zipfile.ZipFile(StringIO(output.getvalue()))
+            assert archive.read("doc.kml") == export()
+
+        def test_unknown_markers():
+            assert_should_raise_exception(lambda: export(markers = "pins"))
+
+        test_multigeometry()
+        test_placemarks()
+        test_simplified()
+        test_streaming()
+        test_kmz()
+        test_unknown_markers()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from pathfinder import Pathfinder
+from mission_exporter import export_mission
+from mission_file import load_mission
+from test_helpers import assert_points_match, assert_should_raise_exception
+
+class TestMissionExporter:
+
+    def test_export_mission(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30 })
+        directory = tempfile.mkdtemp()
+
+        def test_all_formats():
+            qgc, kml = StringIO(), StringIO()
+            outputs = {
+                "qgc": qgc,
+                "kml": kml,
+                "image": os.path.join(directory, "path.jpg"),
+                "mission": os.path.join(directory, "path.bin")
+            }
+            results = export_mission(finder, outputs,
+                                     { "kml": { "markers": None } })
+            assert sorted(results) == sorted(outputs)
+            for result in results.values():
+                assert result.succeeded(), result.error
+                assert result.seconds >= 0
+
+            assert len(qgc.getvalue().splitlines()) == len(finder.get_path()) + 2
+            assert "<MultiGeometry>" not in kml.getvalue()
+            assert os.path.getsize(outputs["image"]) > 0
+            assert_points_match(finder.get_path(),
+                                load_mission(outputs["mission"]).get_path())
+
+        def test_failure_is_isolated():
+            qgc = StringIO()
+            results = export_mission(finder, {
+                "qgc": qgc,
+                "image": os.path.join(directory, "missing", "path.jpg")
+            }, threads = 1)
+            assert not results["image"].succeeded()
+            assert "IOError" in results["image"].error
+            assert results["qgc"].succeeded()
+            assert qgc.getvalue()
+
+        def test_unknown_format():
+            assert_should_raise_exception(
+                    lambda: export_mission(finder, { "tiff": StringIO() }))
+
+        try:
+            test_all_formats()
+            test_failure_is_isolated()
+            test_unknown_format()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import numpy
+from pathfinder import Pathfinder
+from mission_file import Mission, write_mission, load_mission, \
+                         read_qgc_waypoints, read_kml
+from waypoint_generator import WaypointGenerator
+from kml_generator import KMLGenerator
+from test_helpers import assert_points_match, assert_should_raise_exception
+
+class TestMissionFile:
+
+    def test_round_trip(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1.5, 1.25), boundaries, boundaries,
+                            { "wind_angle_degrees": 30, "wp_altitude": 120.0 })
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, "mission.bin")
+
+        def test_binary():
+            write_mission(filename, finder)
+            mission = load_mission(filename)
+            assert numpy.array_equal(mission.get_path().points,
+                                     finder.get_path().points)
+            assert not mission.get_path().points.flags["OWNDATA"]
+            assert mission.plane_location == (1.5, 1.25)
+            assert mission.get_searcharea() == [list(point) for point in boundaries]
+            assert mission.get_altitude() == 120
+            assert mission.get_options() == finder.get_options()
+
+        def test_streaming():
+            write_mission(filename, finder, streaming = True)
+            mission = load_mission(filename)
+            assert numpy.array_equal(mission.get_path().points,
+                                     numpy.array(list(finder.iter_path())))
+
+        def test_empty():
+            write_mission(filename, Mission((0, 0), [], [], [], 100))
+            assert len(load_mission(filename).get_path()) == 0
+
+        def test_not_a_mission():
+            with open(filename, "wb") as mission_file:
+                mission_file.write("QGC WPL 110\n" * 10)
+            assert_should_raise_exception(lambda: load_mission(filename))
+
+        def test_qgc():
+            output = StringIO()
+            WaypointGenerator(finder).export_qgc_waypoints(output)
+            mission = read_qgc_waypoints(StringIO(output.getvalue()))
+            assert_points_match(finder.get_path(), mission.get_path())
+            assert mission.plane_location == (1.5, 1.25)
+            assert mission.get_altitude() == 120
+
+            converted = StringIO()
+            WaypointGenerator(mission).export_qgc_waypoints(converted)
+            assert converted.getvalue() == output.getvalue()
+
+        def test_kml():
+            output = StringIO()
+            KMLGenerator(finder).export_kml(output)
+            mission = read_kml(StringIO(output.getvalue()))
+            assert_points_match(finder.get_path(), mission.get_path())
+            assert_points_match(boundaries, mission.get_boundaries())
+            assert mission.get_altitude() == 120
+
+            converted = StringIO()
+            KMLGenerator(mission).export_kml(converted)
+            assert converted.getvalue() == output.getvalue()
+
+        def test_empty_kml():
+            output = StringIO()
+            KMLGenerator(Mission((0, 0), boundaries, boundaries, [], 100)) \
+                    .export_kml(output)
+            mission = read_kml(StringIO(output.getvalue()))
+            assert len(mission.get_path()) == 0
+            assert_points_match(boundaries, mission.get_searcharea())
+
+        try:
+            test_binary()
+            test_streaming()
+            test_empty()
+            test_not_a_mission()
+            test_qgc()
+            test_kml()
+            test_empty_kml()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,62 @@
+import numpy
+from no_fly_zones import NoFlyZones
+from test_helpers import assert_points_match
+
+class TestNoFlyZones:
+
+    def test_crossed_zones(self):
+        zones = NoFlyZones([[(0, 0), (10, 0), (10, 10), (0, 10)],
+                            [(20, 0), (30, 0), (30, 10), (20, 10)]])
+
+        def test_crossing():
+            assert sorted(zones.crossed_zones((-5, 5), (35, 5))) == [0, 1]
+            assert zones.crossed_zones((15, -5), (15, 15)) == []
+
+        def test_touching():
+            assert zones.crossed_zones((0, 0), (0, 10)) == []
+            assert zones.crossed_zones((10, 5), (20, 5)) == []
+            assert zones.crossed_zones((-5, 5), (0, 5)) == []
+
+        test_crossing()
+        test_touching()
+
+    def test_route(self):
+        def test_around_square():
+            zones = NoFlyZones([[(0, 0), (10, 0), (10, 10), (0, 10)]])
+            route = zones.route((-5, 3), (15, 3))
+            assert len(route) == 2
+            assert_points_match([(0, 0), (10, 0)], route)
+            assert_points_match([(0, 10), (10, 10)], zones.route((-5, 7), (15, 7)))
+            assert len(zones.route((-5, 12), (15, 12))) == 0
+
+        def test_around_several_zones():
+            # The first zone's corners are blocked by the second, so the
+            # route goes around both
+            zones = NoFlyZones([[(0, -10), (10, -10), (10, 10), (0, 10)],
+                                [(-20, 9), (30, 9), (30, 20), (-20, 20)],
+                                [(50, 50), (60, 50), (60, 60)]])
+            route = zones.route((-5, 0), (15, 0))
+            assert len(route) == 2
+            assert_points_match([(0, -10), (10, -10)], route)
+
+        def test_no_route():
+            # The start is inside a zone, so the direct leg is kept
+            zones = NoFlyZones([[(0, 0), (10, 0), (10, 10), (0, 10)]])
+            assert len(zones.route((5, 5), (15, 5))) == 0
+
+        test_around_square()
+        test_around_several_zones()
+        test_no_route()
+
+    def test_route_legs(self):
+        zones = NoFlyZones([[(0, 0), (10, 0), (10, 10), (0, 10)]])
+        points = [(-5, 3), (15, 3), (15, 20), (-5, 20), (-5, 4), (15, 4)]
+        routed, indices = zones.route_legs(points, [0, 2, 4])
+        assert list(indices) == [0, 3, 4, 5, 6, 9]
+        assert_points_match(points, routed[indices])
+        assert_points_match([(0, 0), (10, 0)], routed[1:3])
+        assert_points_match([(0, 0), (10, 0)], routed[7:9])
+
+        unrouted, indices = zones.route_legs(points, [2])
+        assert_points_match(points, unrouted)
+        assert list(indices) == range(len(points))
@@ -1,5 +1,6 @@
 from pathfinder import Pathfinder
 from image_generator import ImageGenerator
+from test_helpers import assert_points_match, assert_should_raise_exception
 
 class TestPathfinder:
 
@@ -62,3 +63,241 @@ class TestPathfinder:
         test_rot_square()
         test_concave()
         test_gps_coords()
+
+    def test_stages(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+
+        def stage_results(finder):
+            finder.get_path()
+            return dict((name, finder.get_stage(name))
+                        for name, inputs in Pathfinder.STAGES)
+
+        def assert_recomputed(before, after, recomputed):
+            for name, inputs in Pathfinder.STAGES:
+                assert (before[name] is not after[name]) == (name in recomputed)
+
+        def test_new_plane_location():
+            finder = Pathfinder((1, 1), boundaries, boundaries)
+            before = stage_results(finder)
+            finder.set_plane_location((1000, 1000))
+            after = stage_results(finder)
+            assert_recomputed(before, after, ["order", "waypoints", "path"])
+            assert_points_match(after["path"], Pathfinder((1000, 1000),
+                boundaries, boundaries).get_path())
+
+        def test_new_altitude():
+            finder = Pathfinder((1, 1), boundaries, boundaries)
+            before = stage_results(finder)
+            finder.set_altitude(100)
+            assert finder.get_altitude() == 100
+            assert_recomputed(before, stage_results(finder), [])
+
+        def test_new_options():
+            finder = Pathfinder((1, 1), boundaries, boundaries)
+            before = stage_results(finder)
+            finder.set_options({ "max_distance_between_waypoints": 20 })
+            after = stage_results(finder)
+            assert_recomputed(before, after, ["waypoints", "path"])
+            assert len(after["path"]) > len(before["path"])
+
+            finder.set_options({ "wind_angle_degrees": 30 })
+            assert_recomputed(after, stage_results(finder),
+                    [name for name, inputs in Pathfinder.STAGES])
+
+        def test_unknown_option():
+            finder = Pathfinder((1, 1), boundaries, boundaries)
+            assert_should_raise_exception(
+                    lambda: finder.set_options({ "path_widht": 20 }))
+            assert_should_raise_exception(
+                    lambda: finder.set_options({ "ordering": "shortest" }))
+            assert_should_raise_exception(
+                    lambda: finder.set_options({ "scanline_offset": "segment" }))
+            assert_should_raise_exception(
+                    lambda: Pathfinder((1, 1), boundaries, boundaries,
+                                       { "scanline_offset": "fewest" }))
+            assert finder.get_options()["scanline_offset"] == 0
+
+        test_new_plane_location()
+        test_new_altitude()
+        test_new_options()
+        test_unknown_option()
+
+    def test_starts_at_plane_location(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((-100, 300), boundaries, boundaries,
+                            { "wind_angle_degrees": 30 })
+        assert_points_match([(-100, 300)], finder.get_path()[:1])
+
+    def test_replan(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        options = { "wind_angle_degrees": 30 }
+
+        def test_last_waypoint():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            line_segments = finder.get_stage("line_segments")
+            order = finder.get_segment_order()
+            halfway = len(finder.get_path()) // 2
+            completed = finder.get_completed_segments(halfway)
+            assert completed == frozenset(index for index, reverse
+                                          in order[:len(completed)])
+            assert 0 < len(completed) < len(line_segments)
+
+            path = finder.replan((300, 400), last_waypoint = halfway)
+            assert_points_match([(300, 400)], path[:1])
+            assert finder.get_stage("line_segments") is line_segments
+            assert sorted(index for index, reverse in finder.get_segment_order()) == \
+                   sorted(set(range(len(line_segments))) - completed)
+            assert len(path) < len(Pathfinder((300, 400), boundaries, boundaries,
+                                              options).get_path())
+
+        def test_completed_segments():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            count = len(finder.get_stage("line_segments"))
+            finder.replan((1, 1), completed_segments = range(count - 1))
+            assert [index for index, reverse in finder.get_segment_order()] == \
+                   [count - 1]
+            path = finder.replan((1, 1), completed_segments = [count - 1])
+            assert finder.get_segment_order() == []
+            assert_points_match([(1, 1)], path)
+
+        def test_new_line_segments():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            count = len(finder.get_stage("line_segments"))
+            finder.replan((50, 50), completed_segments = [count - 2, count - 1])
+            finder.set_options({ "max_distance_between_waypoints": 20 })
+            assert len(finder.get_segment_order()) == count - 2
+
+            # The indices would be out of range of the fewer, wider passes
+            finder.set_options({ "path_width": 200 })
+            line_segments = finder.get_stage("line_segments")
+            assert len(line_segments) < count - 2
+            assert sorted(index for index, reverse in finder.get_segment_order()) == \
+                   range(len(line_segments))
+            assert_points_match([(50, 50)], finder.get_path()[:1])
+
+        test_last_waypoint()
+        test_completed_segments()
+        test_new_line_segments()
+
+    def test_iter_path(self):
+        import numpy
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        options = { "wind_angle_degrees": 30 }
+
+        def test_single_band_matches_get_path():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            streamed = numpy.concatenate(list(finder.iter_path_chunks(1000)))
+            assert_points_match(finder.get_path(), streamed)
+
+        def test_bands_continue_path():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            chunks = list(finder.iter_path_chunks(band_size = 3))
+            assert len(chunks) > 1
+            path = numpy.concatenate(chunks)
+            assert_points_match([(1, 1)], path[:1])
+            assert not (path[1:] == path[:-1]).all(axis = 1).any()
+
+            # Every line segment is flown, in the original orientation
+            line_segments = finder.get_stage("line_segments")
+            center, angle = finder.get_stage("rotated_searcharea")[:2]
+            from geometry_operations import rotate
+            rotated = numpy.round(rotate(path, center, angle), 6)
+            flown = set(map(tuple, rotated))
+            for line_segment in numpy.round(line_segments, 6):
+                assert tuple(line_segment[0]) in flown
+                assert tuple(line_segment[1]) in flown
+
+        def test_completed_segments():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            count = len(finder.get_stage("line_segments"))
+            finder.replan((1, 1), completed_segments = range(count))
+            assert_points_match([(1, 1)], list(finder.iter_path(band_size = 3)))
+
+        test_single_band_matches_get_path()
+        test_bands_continue_path()
+        test_completed_segments()
+
+    def test_plan_anytime(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        options = { "wind_angle_degrees": 30, "path_width": 37 }
+
+        def test_first_plan_is_ordering():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            plan = finder.plan_anytime(time_budget = 0)
+            assert plan.wait(10)
+            assert plan.error is None
+            assert_points_match(finder.get_path(), plan.get_path())
+            assert plan.get_segment_order() == finder.get_segment_order()
+            assert plan.get_improvement() == 0
+
+        def test_refines_with_callback():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            published = []
+            plan = finder.plan_anytime(
+                    lambda path, improvement: published.append(improvement))
+            assert plan.wait(10)
+            assert plan.updates == len(published) > 0
+            assert plan.get_improvement() == published[-1] > 0
+            assert len(plan.get_path()) > 0
+
+            finder.set_options({ "optimization_time_budget": 10 })
+            assert finder.get_segment_order() == plan.get_segment_order()
+            assert_points_match(finder.get_path(), plan.get_path())
+
+        def test_cancel():
+            finder = Pathfinder((1, 1), boundaries, boundaries, options)
+            plan = finder.plan_anytime()
+            plan.cancel()
+            assert plan.wait(10)
+            assert plan.cancelled()
+            assert sorted(index for index, reverse in plan.get_segment_order()) == \
+                   range(len(finder.get_stage("line_segments")))
+
+        test_first_plan_is_ordering()
+        test_refines_with_callback()
+        test_cancel()
+
+    def test_exclusions(self):
+        import numpy
+        import shapely.geometry
+        from geometry_operations import rotate
+        boundaries = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+        zone = [(300, 300), (700, 300), (700, 600), (300, 600)]
+
+        def test_no_fly_zones():
+            finder = Pathfinder((-100, -100), boundaries, boundaries,
+                    { "wind_angle_degrees": 30, "no_fly_zones": [zone] })
+            path = finder.get_path()
+            polygon = shapely.geometry.Polygon(zone).buffer(-1e-6)
+            for start, stop in path.get_legs():
+                if (start != stop).any():
+                    assert not shapely.geometry.LineString([start, stop]) \
+                                              .intersects(polygon)
+
+            # Each line segment is completed at its far end
+            line_segments = finder.get_stage("line_segments")
+            center, angle = finder.get_stage("rotated_searcharea")[:2]
+            completed_at = finder.get_stage("waypoints")[1]
+            for (index, reverse), waypoint in zip(finder.get_segment_order(),
+                                                   completed_at):
+                end = line_segments[index][0 if reverse else 1]
+                assert_points_match(rotate([end], center, -angle), [path[waypoint]])
+
+        def test_holes():
+            options = { "holes": [zone], "overshoot_distance": 0 }
+            finder = Pathfinder((0, 0), boundaries, boundaries, options)
+            without = Pathfinder((0, 0), boundaries, boundaries,
+                                 { "overshoot_distance": 0 })
+            lengths = lambda line_segments: numpy.abs(
+                    line_segments[:, 1, 1] - line_segments[:, 0, 1]).sum()
+            assert abs(lengths(without.get_stage("line_segments")) -
+                       lengths(finder.get_stage("line_segments")) - 7 * 300) < 1e-6
+
+            # Only the stages from the line segments on are recomputed
+            rotated = finder.get_stage("rotated_searcharea")
+            finder.set_options({ "holes": [] })
+            assert finder.get_stage("rotated_searcharea") is rotated
+            assert_points_match(without.get_path(), finder.get_path())
+
+        test_no_fly_zones()
+        test_holes()
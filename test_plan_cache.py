@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+
+from plan_cache import PlanCache
+from pathfinder import Pathfinder
+from test_helpers import assert_points_match
+
+class TestPlanCache:
+
+    def test_key(self):
+        square = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+
+        def test_canonical():
+            key = PlanCache.key({ "plane_location": (1, 1), "searcharea": square,
+                                  "path_width": 50 })
+            assert key == PlanCache.key({ "plane_location": [1.0, 1.0],
+                                          "searcharea": [list(point) for point in square],
+                                          "path_width": 50.0 })
+
+        def test_options_matter():
+            key = PlanCache.key({ "searcharea": square, "path_width": 50 })
+            assert key != PlanCache.key({ "searcharea": square, "path_width": 51 })
+            assert key != PlanCache.key({ "searcharea": square, "ordering": 50 })
+
+        test_canonical()
+        test_options_matter()
+
+    def test_lru(self):
+        cache = PlanCache(max_entries = 2)
+        cache.put("a", [(0, 0)])
+        cache.put("b", [(1, 1)])
+        assert cache.get("a") == [(0, 0)]
+        cache.put("c", [(2, 2)])
+        assert cache.get("b") is None
+        assert cache.get("a") == [(0, 0)]
+        assert cache.get("c") == [(2, 2)]
+        assert (cache.hits, cache.misses) == (3, 1)
+
+    def test_pathfinder(self):
+        square = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+        directory = tempfile.mkdtemp()
+
+        def test_memory():
+            cache = PlanCache()
+            path = Pathfinder((1, 1), square, square, plan_cache = cache).get_path()
+            cached = Pathfinder((1, 1), square, square, { "path_width": 61 },
+                                plan_cache = cache).get_path()
+            assert cached is path
+            assert not cached.points.flags.writeable
+            Pathfinder((1, 1), square, square, { "path_width": 60 },
+                       plan_cache = cache).get_path()
+            assert (cache.hits, cache.misses) == (1, 2)
+
+        def test_unplanned_inputs():
+            # Nothing that is planned reads the boundaries or the altitude
+            cache = PlanCache()
+            path = Pathfinder((1, 1), square, square, plan_cache = cache).get_path()
+            cached = Pathfinder((1, 1), square, square[::-1], { "wp_altitude": 50 },
+                                plan_cache = cache).get_path()
+            assert cached is path
+            assert (cache.hits, cache.misses) == (1, 1)
+
+        def test_disk():
+            path = Pathfinder((1, 1), square, square,
+                              plan_cache = PlanCache(directory = directory)).get_path()
+            cache = PlanCache(directory = directory)
+            cached = Pathfinder((1, 1), square, square,
+                                plan_cache = cache).get_path()
+            assert (cache.hits, cache.disk_hits, cache.misses) == (1, 1, 0)
+            assert not cached.points.flags.writeable
+            assert_points_match(path, cached)
+            assert len(path) == len(cached)
+
+        try:
+            test_memory()
+            test_unplanned_inputs()
+            test_disk()
+        finally:
+            shutil.rmtree(directory)
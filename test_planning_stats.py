@@ -0,0 +1,80 @@
+from pathfinder import Pathfinder
+from planning_stats import PlanningStats, timed, count
+from plan_cache import PlanCache
+
+class TestPlanningStats:
+
+    def test_record(self):
+        def test_stages_and_counters():
+            recorded = []
+            stats = PlanningStats([lambda *event: recorded.append(event)])
+            assert timed(stats, "double", lambda x: 2 * x, 21) == 42
+            timed(stats, "double", lambda: None)
+            count(stats, "things", 3)
+            count(stats, "things")
+            assert stats.stage_calls == { "double": 2 }
+            assert stats.stage_seconds["double"] >= 0
+            assert stats.counters == { "things": 4 }
+            assert [event[:2] for event in recorded] == [("seconds", "double"),
+                    ("seconds", "double"), ("count", "things"), ("count", "things")]
+
+            stats.reset()
+            assert stats.as_dict() == { "stage_seconds": {}, "stage_calls": {},
+                                        "counters": {} }
+            assert len(stats.hooks) == 1
+
+        def test_disabled():
+            assert timed(None, "double", lambda x: 2 * x, 21) == 42
+            count(None, "things")
+
+        test_stages_and_counters()
+        test_disabled()
+
+    def test_pathfinder(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        options = { "wind_angle_degrees": 30, "optimization_time_budget": 1 }
+
+        def test_stages():
+            stats = PlanningStats()
+            finder = Pathfinder((1, 1), boundaries, boundaries, options, stats = stats)
+            path = finder.get_path()
+            for name, inputs in Pathfinder.STAGES:
+                assert stats.stage_calls[name] == 1
+            for name in ("order.initial", "order.improve", "waypoints.densify",
+                         "waypoints.dedup"):
+                assert stats.stage_calls[name] == 1
+
+            counters = stats.counters
+            assert counters["line_segments"] == len(finder.get_stage("line_segments"))
+            assert counters["distance_evaluations"] > 0
+            assert counters["waypoints_after_dedup"] == len(path)
+            assert counters["waypoints_before_dedup"] > len(path)
+
+            # Only the stages that depend on a changed option are recomputed
+            finder.set_options({ "max_distance_between_waypoints": 20 })
+            finder.get_path()
+            assert stats.stage_calls["order"] == 1
+            assert stats.stage_calls["waypoints"] == 2
+
+        def test_same_path():
+            stats = PlanningStats()
+            options = { "wind_angle_degrees": 30, "ordering": "boustrophedon" }
+            path = Pathfinder((1, 1), boundaries, boundaries, options,
+                              stats = stats).get_path()
+            assert stats.counters["distance_evaluations"] > 0
+            assert (path.points == Pathfinder((1, 1), boundaries, boundaries,
+                    options).get_path().points).all()
+
+        def test_plan_cache():
+            stats = PlanningStats()
+            cache = PlanCache()
+            for repeat in range(2):
+                Pathfinder((1, 1), boundaries, boundaries, {}, cache,
+                           stats).get_path()
+            assert stats.counters["plan_cache_misses"] == 1
+            assert stats.counters["plan_cache_hits"] == 1
+            assert stats.stage_calls["path"] == 1
+
+        test_stages()
+        test_same_path()
+        test_plan_cache()
@@ -0,0 +1,84 @@
+import numpy
+from pathfinder import Pathfinder
+from projection import LocalProjection, get_local_projection
+from test_helpers import assert_close_enough, assert_points_match, \
+                         assert_should_raise_exception
+
+class TestProjection:
+
+    def test_local_projection(self):
+        def test_scale():
+            # Lengths of a degree on the WGS84 ellipsoid
+            equator = LocalProjection((0, 0))
+            assert_close_enough(equator.scale[0], 110574.3, 0.1)
+            assert_close_enough(equator.scale[1], 111319.5, 0.1)
+            midlatitude = LocalProjection((45, 10))
+            assert_close_enough(midlatitude.scale[0], 111132.0, 0.5)
+            assert_close_enough(midlatitude.scale[1], 78846.8, 0.5)
+
+        def test_round_trip():
+            projection = LocalProjection((38.144, -76.43))
+            points = [(38.15, -76.44), (38.14, -76.42), (38.144, -76.43)]
+            meters = projection.to_meters(points)
+            assert_points_match([(0, 0)], meters[2:])
+            assert meters[0][0] > 0 and meters[0][1] < 0
+            assert_points_match(points, projection.to_degrees(meters))
+
+        def test_antimeridian():
+            projection = LocalProjection((-16, 179.999))
+            east = projection.to_meters([(-16, -179.999)])[0]
+            assert_close_enough(east[0], 0)
+            assert 0 < east[1] < 250
+            assert numpy.allclose(projection.to_degrees([east]), [(-16, -179.999)])
+            assert numpy.allclose(projection.to_degrees([(0, 0)]), [(-16, 179.999)])
+
+            # A 2 km square across the antimeridian is planned around it
+            square = [(-16.009, 179.991), (-16.009, -179.991),
+                      (-15.991, -179.991), (-15.991, 179.991)]
+            assert numpy.allclose(get_local_projection(square).origin, (-16, -180))
+            finder = Pathfinder((-16.009, 179.991), square, square,
+                                { "projection": "local", "path_width": 100 })
+            path = numpy.asarray(finder.get_path())
+            assert len(finder.get_stage("line_segments")) == 2000 // 100
+            # Each pass has a waypoint every 50 meters, rather than every 50
+            # meters of a pass around the world
+            assert len(path) < 1000
+            assert numpy.abs(path[:, 1]).min() > 179.98
+
+        def test_cache():
+            area = [(32.961, -117.190), (32.962, -117.187), (32.962, -117.189)]
+            assert get_local_projection(area) is get_local_projection(list(area))
+            assert get_local_projection(area) is not get_local_projection(area[:2])
+
+        test_scale()
+        test_round_trip()
+        test_antimeridian()
+        test_cache()
+
+    def test_pathfinder(self):
+        searcharea = [(60.0, 10.0), (60.01, 10.0), (60.01, 10.02), (60.0, 10.02)]
+        options = { "projection": "local", "path_width": 50,
+                    "overshoot_distance": 0 }
+
+        def test_path_width_in_meters():
+            finder = Pathfinder((59.999, 9.999), searcharea, searcharea, options)
+            xs = numpy.unique(finder.get_stage("line_segments")[:, :, 0])
+            assert numpy.allclose(numpy.diff(xs), 50)
+
+            # About 1113 meters north to south, at most 50 meters apart
+            path = finder.get_path()
+            assert_points_match([(59.999, 9.999)], path[:1])
+            latitudes, longitudes = numpy.asarray(path)[1:].T
+            assert latitudes.min() >= 60.0 - 1e-9 and latitudes.max() <= 60.01 + 1e-9
+            assert longitudes.min() >= 10.0 - 1e-9 and longitudes.max() <= 10.02 + 1e-9
+            assert len(xs) == 1113 // 50 + 1
+
+        def test_unknown_projection():
+            assert_should_raise_exception(lambda: Pathfinder((0, 0), searcharea,
+                    searcharea, { "projection": "utm" }))
+            finder = Pathfinder((0, 0), searcharea, searcharea)
+            assert_should_raise_exception(
+                    lambda: finder.set_options({ "projection": "utm" }))
+
+        test_path_width_in_meters()
+        test_unknown_projection()
@@ -0,0 +1,224 @@
+import numpy
+import geometry_operations
+import segment_ordering
+
+from test_helpers import assert_close_enough
+from functools import partial
+
+class TestSegmentOrdering:
+
+    def test_endpoint_index(self):
+        from segment_ordering import EndpointIndex
+
+        def test_nearest():
+            segments = [((5, 3), (1, 1)), ((12, 9), (9, 12)), ((-5, -5), (5, 5))]
+            index = EndpointIndex(segments)
+            assert index.nearest((0, 0)) == (0, True)
+            index.remove(0)
+            assert index.nearest((0, 0)) == (2, False)
+            assert index.remaining == 2
+
+        def test_ties():
+            segments = [((0, 1), (0, 2)), ((1, 0), (-1, 0)), ((0, -1), (0, -2))]
+            index = EndpointIndex(segments)
+            assert index.nearest((0, 0)) == (0, False)
+            index.remove(0)
+            assert index.nearest((0, 0)) == (1, False)
+
+        test_nearest()
+        test_ties()
+
+    def test_order_greedy(self):
+        from segment_ordering import order_greedy, connect_ordered
+
+        def connect_with_sort(start_point, line_segments):
+            path = [start_point]
+            line_segments = list(line_segments)
+            while line_segments:
+                nearest = geometry_operations.find_closest_line_segment(
+                        start_point, line_segments)
+                close_point, far_point = sorted(nearest,
+                        key = partial(geometry_operations.dist, start_point))
+                path += [close_point, far_point]
+                line_segments.remove(nearest)
+                start_point = far_point
+            return path
+
+        def assert_matches_sort(start_point, boundaries, dx):
+            line_segments = geometry_operations.calculate_line_segments(
+                    boundaries, dx, 5)
+            order = order_greedy(start_point, line_segments)
+            expected = connect_with_sort(start_point,
+                    [tuple(map(tuple, segment)) for segment in line_segments])
+            assert numpy.array_equal(connect_ordered(start_point,
+                    line_segments, order), expected)
+
+        def test_no_segments():
+            assert order_greedy((0, 0), []) == []
+
+        def test_square():
+            boundaries = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+            assert_matches_sort((1, 1), boundaries, 61)
+            assert_matches_sort((500, 500), boundaries, 100)
+
+        def test_concave():
+            boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+            assert_matches_sort((1, 1), boundaries, 37)
+
+        test_no_segments()
+        test_square()
+        test_concave()
+
+    def test_decompose_cells(self):
+        from segment_ordering import decompose_cells
+
+        def test_convex():
+            boundaries = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+            line_segments = geometry_operations.calculate_line_segments(
+                    boundaries, 100, 5)
+            assert decompose_cells(line_segments) == [range(10)]
+
+        def test_split():
+            boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+            line_segments = geometry_operations.calculate_line_segments(
+                    boundaries, 100, 5)
+            cells = decompose_cells(line_segments)
+            assert cells == [[0, 1, 2, 3, 4, 5, 6, 8, 10, 12], [7, 9, 11, 13]]
+
+        test_convex()
+        test_split()
+
+    def test_order_boustrophedon(self):
+        from segment_ordering import order_boustrophedon, order_greedy, \
+                                     connect_ordered
+        import math
+        import time
+        from benchmark import generate_polygon
+
+        def path_length(start_point, line_segments, order):
+            path = connect_ordered(start_point, line_segments, order)
+            return sum(geometry_operations.dist(start, stop)
+                       for start, stop in zip(path, path[1:]))
+
+        def assert_shorter_than_greedy(start_point, boundaries):
+            line_segments = geometry_operations.calculate_line_segments(
+                    boundaries, 37, 20)
+            order = order_boustrophedon(start_point, line_segments)
+            assert sorted(index for index, reverse in order) == \
+                   range(len(line_segments))
+            assert path_length(start_point, line_segments, order) < \
+                   path_length(start_point, line_segments,
+                               order_greedy(start_point, line_segments))
+
+        def test_alternates_direction():
+            boundaries = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+            line_segments = geometry_operations.calculate_line_segments(
+                    boundaries, 250, 0)
+            order = order_boustrophedon((1000, 1000), line_segments)
+            assert order == [(3, True), (2, False), (1, True), (0, False)]
+
+        def test_concave():
+            boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+            assert_shorter_than_greedy((1, 1), boundaries)
+
+        def test_star():
+            radii = [1000, 400] * 5
+            boundaries = [(radius * math.cos(math.pi * i / 5),
+                           radius * math.sin(math.pi * i / 5))
+                          for i, radius in enumerate(radii)]
+            assert_shorter_than_greedy((0, 0), boundaries)
+
+        def test_generated_areas():
+            # Over the seeded areas of the benchmark, never longer than
+            # greedy, and shorter wherever the area is concave
+            for kind in ("convex", "concave", "star", "many_vertex"):
+                for seed in range(10 if kind != "many_vertex" else 1):
+                    boundaries = geometry_operations.rotate(
+                            generate_polygon(kind, seed), (0, 0), math.radians(30))
+                    line_segments = geometry_operations.calculate_line_segments(
+                            boundaries, 61, 61)
+                    start_point = (-2000, -2000)
+                    greedy = path_length(start_point, line_segments,
+                            order_greedy(start_point, line_segments))
+                    boustrophedon = path_length(start_point, line_segments,
+                            order_boustrophedon(start_point, line_segments))
+                    if kind == "convex":
+                        assert boustrophedon <= greedy + 1e-6
+                    else:
+                        assert boustrophedon < greedy
+
+        def test_many_cells():
+            # Columns of three segments at random heights split into hundreds
+            # of cells, which took minutes when every exit was compared with
+            # every entry after each cell
+            random = numpy.random.RandomState(1)
+            line_segments = []
+            for column in range(400):
+                ends = numpy.sort(random.uniform(0, 1000, 6))
+                line_segments += [((column * 10.0, bottom), (column * 10.0, top))
+                                  for bottom, top in zip(ends[0::2], ends[1::2])]
+            start = time.time()
+            order = order_boustrophedon((0, 0), numpy.array(line_segments))
+            assert time.time() - start < 10
+            assert sorted(index for index, reverse in order) == \
+                   range(len(line_segments))
+
+        assert order_boustrophedon((0, 0), []) == []
+        test_alternates_direction()
+        test_concave()
+        test_star()
+        test_generated_areas()
+        test_many_cells()
+
+    def test_improve_order(self):
+        from segment_ordering import improve_order, order_greedy, \
+                                     transit_length
+        import segment_ordering
+
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        line_segments = geometry_operations.calculate_line_segments(
+                boundaries, 37, 20)
+        order = order_greedy((0, 0), line_segments)
+        length = transit_length((0, 0), line_segments, order)
+
+        def assert_improves(order):
+            improved, improvement = improve_order((0, 0), line_segments,
+                                                  order, 5)
+            assert sorted(index for index, reverse in improved) == \
+                   range(len(line_segments))
+            assert improvement > 0
+            assert_close_enough(length - improvement,
+                    transit_length((0, 0), line_segments, improved))
+
+        def test_improves_greedy():
+            assert_improves(order)
+
+        def test_without_distance_matrix():
+            max_points = segment_ordering.MAX_DISTANCE_MATRIX_POINTS
+            segment_ordering.MAX_DISTANCE_MATRIX_POINTS = 0
+            try:
+                assert_improves(order)
+            finally:
+                segment_ordering.MAX_DISTANCE_MATRIX_POINTS = max_points
+
+        def test_no_time():
+            assert improve_order((0, 0), line_segments, order, 0) == (order, 0)
+
+        def test_callback():
+            published = []
+            result = improve_order((0, 0), line_segments, order, None,
+                                   lambda *update: published.append(update))
+            assert published
+            assert published[-1] == result
+            improvements = [improvement for better, improvement in published]
+            assert improvements == sorted(improvements)
+
+        def test_should_stop():
+            assert improve_order((0, 0), line_segments, order, None,
+                                 should_stop = lambda: True) == (order, 0)
+
+        test_improves_greedy()
+        test_without_distance_matrix()
+        test_no_time()
+        test_callback()
+        test_should_stop()
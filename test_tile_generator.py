@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+import numpy
+import shapely.geometry
+from pathfinder import Pathfinder
+from tile_generator import TileGenerator, index_legs
+from PIL import Image
+
+class TestTileGenerator:
+
+    def test_index_legs(self):
+        legs = numpy.array([[(5, 5), (95, 5)], [(5, 5), (95, 95)],
+                            [(60, 10), (60, 10)], [(0, 99), (99, 60)]],
+                           dtype = float)
+        cells_per_side, cell_size = 4, 25.0
+        starts, leg_ids = index_legs(legs, numpy.array([0.0, 0.0]), cell_size,
+                                     cells_per_side)
+        assert len(starts) == cells_per_side ** 2 + 1
+
+        for x in range(cells_per_side):
+            for y in range(cells_per_side):
+                cell = x * cells_per_side + y
+                listed = set(leg_ids[starts[cell]:starts[cell + 1]])
+                box = shapely.geometry.box(x * cell_size, y * cell_size,
+                        (x + 1) * cell_size, (y + 1) * cell_size)
+                for index, leg in enumerate(legs):
+                    geometry = shapely.geometry.LineString(leg) \
+                            if (leg[0] != leg[1]).any() else shapely.geometry.Point(leg[0])
+                    if geometry.intersects(box):
+                        assert index in listed
+
+    def test_create_tiles(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30 })
+        directory = tempfile.mkdtemp()
+
+        def test_pyramid(processes):
+            saved = TileGenerator(finder).create_tiles(directory, 2,
+                                                       processes = processes)
+            assert saved == 1 + 4 + 16
+            for zoom in range(3):
+                for x in range(2 ** zoom):
+                    for y in range(2 ** zoom):
+                        tile = Image.open(os.path.join(directory, str(zoom),
+                                                       str(x), "%d.png" % y))
+                        assert tile.size == (256, 256)
+
+        try:
+            test_pyramid(1)
+            test_pyramid(2)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,80 @@
+import re
+import zlib
+from StringIO import StringIO
+from xml.etree import ElementTree
+
+import numpy
+from pathfinder import Pathfinder
+from vector_generator import VectorGenerator
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+class TestVectorGenerator:
+
+    def test_export(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30 })
+        path = finder.get_path()
+
+        def export_svg(**kwargs):
+            output = StringIO()
+            VectorGenerator(finder).export_svg(output, size = (400, 400), **kwargs)
+            return ElementTree.fromstring(output.getvalue())
+
+        def absolute_points(data):
+            """
+                Returns the points of SVG path data made of one moveto and
+                one run of relative linetos
+            """
+            numbers = [float(number) for number in re.findall(r"-?[\d.]+", data)]
+            points = numpy.reshape(numbers, (-1, 2))
+            if "l" in data:
+                points = numpy.cumsum(points, axis = 0)
+            return points
+
+        def test_svg_quantized():
+            svg = export_svg()
+            assert svg.get("width") == "500" and svg.get("viewBox") == "0 0 5000 5000"
+            boundary, searcharea, line = svg.findall(SVG + "path")
+            assert boundary.get("d").endswith("z")
+            points = absolute_points(line.get("d"))
+            assert len(points) == len(path)
+            assert all(point == int(point) for point in points.ravel())
+
+            exact = absolute_points(export_svg(precision = None)
+                                    .findall(SVG + "path")[2].get("d"))
+            assert abs(points / 10.0 - exact).max() <= 0.05 + 1e-9
+
+        def test_svg_chunks():
+            chunk_size = VectorGenerator.CHUNK_SIZE
+            VectorGenerator.CHUNK_SIZE = 7
+            try:
+                data = export_svg().findall(SVG + "path")[2].get("d")
+            finally:
+                VectorGenerator.CHUNK_SIZE = chunk_size
+            assert data.count("l") == -(-(len(path) - 1) // 7)
+            unchunked = export_svg().findall(SVG + "path")[2].get("d")
+            assert data.replace("l", " ").split() == unchunked.replace("l", " ").split()
+
+        def test_pdf():
+            output = StringIO()
+            VectorGenerator(finder).export_pdf(output, size = (400, 400))
+            document = output.getvalue()
+            assert document.startswith("%PDF-1.4\n")
+            assert document.endswith("%%EOF\n")
+
+            startxref = int(document.split("startxref\n")[1].split("\n")[0])
+            assert document[startxref:].startswith("xref\n0 5\n")
+            entries = document[startxref:].split("\n")[3:7]
+            for number, entry in enumerate(entries, 1):
+                offset = int(entry.split()[0])
+                assert document[offset:].startswith("%d 0 obj" % number)
+
+            stream = document.split("stream\n", 1)[1].rsplit("\nendstream", 1)[0]
+            content = zlib.decompress(stream)
+            assert content.count(" l\n") == len(path) - 1 + 2 * (len(boundaries) - 1)
+
+        test_svg_quantized()
+        test_svg_chunks()
+        test_pdf()
@@ -0,0 +1,55 @@
+import gzip
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from pathfinder import Pathfinder
+from waypoint_generator import WaypointGenerator
+
+class TestWaypointGenerator:
+
+    def test_export_qgc_waypoints(self):
+        boundaries = [(0, 0), (1000, 0), (500, 500), (1000, 1000), (0, 1000)]
+        finder = Pathfinder((1.5, 1), boundaries, boundaries,
+                            { "wind_angle_degrees": 30, "wp_altitude": 120 })
+        path = finder.get_path()
+
+        def export(*args, **kwargs):
+            output = StringIO()
+            WaypointGenerator(finder).export_qgc_waypoints(output, *args, **kwargs)
+            return output.getvalue()
+
+        def test_lines():
+            lines = export().splitlines()
+            assert lines[0] == "QGC WPL 110"
+            assert lines[1] == "0\t1\t0\t16\t0\t0\t0\t0\t1.5\t1\t120.000000\t1"
+            assert len(lines) == len(path) + 2
+            x, y = path[-1]
+            assert lines[-1] == "%d\t0\t3\t16\t0.000000\t0.000000\t0.000000\t" \
+                    "0.000000\t%.6f\t%.6f\t120.000000\t1" % (len(path), x, y)
+
+        def test_streaming():
+            lines = export(streaming = True).splitlines()
+            assert len(lines) == len(path) + 2
+            assert [line.split("\t")[0] for line in lines[1:]] == \
+                   [str(index) for index in range(len(path) + 1)]
+
+        def test_gzip():
+            compressed = export(compress = True)
+            text = gzip.GzipFile(fileobj = StringIO(compressed)).read()
+            assert text == export()
+
+        def test_file_name():
+            directory = tempfile.mkdtemp()
+            try:
+                name = os.path.join(directory, "mission.txt.gz")
+                WaypointGenerator(finder).export_qgc_waypoints(name)
+                assert gzip.open(name).read() == export()
+            finally:
+                shutil.rmtree(directory)
+
+        test_lines()
+        test_streaming()
+        test_gzip()
+        test_file_name()
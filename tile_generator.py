@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+
+import numpy
+import shapely.geometry
+import shapely.prepared
+from geometry_operations import Path, get_bounding_box
+from PIL import Image, ImageDraw
+
+def index_legs(legs, origin, cell_size, cells_per_side):
+    """
+        Builds a grid index of *legs*, an (N, 2, 2) array of line segments,
+        over a square of *cells_per_side* cells of side *cell_size* whose
+        corner is *origin*. Returns two arrays in compressed sparse row
+        form: the legs that pass through cell (x, y) are
+        leg_ids[starts[c]:starts[c + 1]], where c = x * cells_per_side + y.
+
+        Each leg is sampled every half cell, and each pair of consecutive
+        samples adds the two by two block of cells around it, so a leg is
+        listed in every cell it passes through (and maybe a few neighbours).
+    """
+    legs = numpy.asarray(legs, dtype = float).reshape(-1, 2, 2)
+    starts, stops = (legs[:, 0] - origin) / cell_size, (legs[:, 1] - origin) / cell_size
+    lengths = numpy.hypot(*(stops - starts).T)
+    samples = numpy.ceil(lengths * 2).astype(int) + 1
+
+    leg_ids = numpy.repeat(numpy.arange(len(legs)), samples)
+    first_sample = numpy.repeat(numpy.cumsum(samples) - samples, samples)
+    fraction = (numpy.arange(samples.sum()) - first_sample) / \
+               numpy.maximum(samples[leg_ids] - 1, 1).astype(float)
+    points = starts[leg_ids] + fraction[:, None] * (stops - starts)[leg_ids]
+    cells = numpy.clip(numpy.floor(points).astype(int), 0, cells_per_side - 1)
+
+    # Pair each sample with the next one of the same leg, or itself if it
+    # is the last sample of its leg
+    is_last = numpy.r_[leg_ids[1:] != leg_ids[:-1], True]
+    following = numpy.where(is_last, numpy.arange(len(cells)),
+                            numpy.arange(len(cells)) + 1)
+    low = numpy.minimum(cells, cells[following])
+    high = numpy.maximum(cells, cells[following])
+    corners = [(low[:, 0], low[:, 1]), (low[:, 0], high[:, 1]),
+               (high[:, 0], low[:, 1]), (high[:, 0], high[:, 1])]
+    cell_ids = numpy.concatenate([x * cells_per_side + y for x, y in corners])
+
+    pairs = numpy.unique(cell_ids * len(legs) + numpy.tile(leg_ids, 4))
+    cell_ids, leg_ids = pairs // max(len(legs), 1), pairs % max(len(legs), 1)
+    starts = numpy.searchsorted(cell_ids, numpy.arange(cells_per_side ** 2 + 1))
+    return starts, leg_ids
+
+def _render_tile(task):
+    """
+        Renders one tile of TileGenerator.create_tiles and saves it. Runs in
+        a worker process, so it must stay a module level function. It is
+        given only the legs that pass through its tile, in pixels relative
+        to the tile.
+    """
+    filename, tile_size, legs, boundaries = task
+    # The tiles only use shades of grey, which are much faster to encode as
+    # grayscale than as RGB
+    image = Image.new("L", (tile_size, tile_size), 0xFF)
+    draw = ImageDraw.Draw(image)
+    draw.polygon([tuple(point) for point in boundaries], 0x99)
+    for start, stop in legs:
+        draw.line([tuple(start), tuple(stop)], 0x00)
+
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another worker made it first
+            pass
+    image.save(filename, 'png')
+
+class TileGenerator:
+    """
+        Generates a pyramid of image tiles of a path and search area, in
+        the XYZ layout that slippy map viewers read: the tile in column x
+        and row y of zoom level z is saved as z/x/y.png. Zoom level 0 is one
+        tile covering the square around the path and search area, and each
+        level splits every tile of the level before into four. Tiles are
+        oriented like the image of ImageGenerator.
+    """
+    TILE_SIZE = 256
+    BATCH_SIZE = 256
+
+    def __init__(self, pathfinder):
+        self.pathfinder = pathfinder
+
+    def create_tiles(self, directory, max_zoom, min_zoom = 0, processes = None):
+        """
+            Renders the tiles of zoom levels *min_zoom* to *max_zoom* into
+            *directory*, on a pool of *processes* worker processes (all cores
+            if None, in this process if 1). Each tile only draws the legs of
+            the path that pass through it, found through a grid index of the
+            legs. Tiles are handed to the workers a batch at a time, so
+            memory use doesn't grow with the number of tiles. Tiles with
+            nothing on them are not saved. Returns the number of tiles saved.
+        """
+        assert 0 <= min_zoom <= max_zoom
+        path = Path(self.pathfinder.get_path())
+        boundaries = numpy.asarray(self.pathfinder.boundaries, dtype = float)
+        legs = path.get_legs()
+
+        smallest, largest = numpy.array(get_bounding_box(
+                numpy.vstack([boundaries, path.points])))
+        side = max(largest - smallest) or 1.0
+        searcharea = shapely.prepared.prep(shapely.geometry.Polygon(boundaries))
+
+        def tasks(zoom):
+            tiles_per_side = 2 ** zoom
+            tile_side = side / tiles_per_side
+            starts, leg_ids = index_legs(legs, smallest, tile_side, tiles_per_side)
+            scale = TileGenerator.TILE_SIZE / tile_side
+
+            for x in xrange(tiles_per_side):
+                for y in xrange(tiles_per_side):
+                    cell = x * tiles_per_side + y
+                    tile_legs = legs[leg_ids[starts[cell]:starts[cell + 1]]]
+                    corner = smallest + numpy.array([x, y]) * tile_side
+                    tile_box = shapely.geometry.box(corner[0], corner[1],
+                            corner[0] + tile_side, corner[1] + tile_side)
+                    if not len(tile_legs) and not searcharea.intersects(tile_box):
+                        continue
+
+                    filename = os.path.join(directory, str(zoom), str(x),
+                                            "%d.png" % y)
+                    yield filename, TileGenerator.TILE_SIZE, \
+                          (tile_legs - corner) * scale, (boundaries - corner) * scale
+
+        def batches():
+            for zoom in range(min_zoom, max_zoom + 1):
+                batch = []
+                for task in tasks(zoom):
+                    batch.append(task)
+                    if len(batch) == TileGenerator.BATCH_SIZE:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+        saved = 0
+        if processes == 1:
+            for batch in batches():
+                map(_render_tile, batch)
+                saved += len(batch)
+            return saved
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            for batch in batches():
+                pool.map(_render_tile, batch)
+                saved += len(batch)
+        finally:
+            pool.close()
+            pool.join()
+        return saved
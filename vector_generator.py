@@ -0,0 +1,169 @@
+import sys
+import zlib
+
+import numpy
+import geometry_operations
+from geometry_operations import get_bounding_box, normalize_and_pad
+
+def _format_numbers(values, number_format, separator):
+    values = tuple(numpy.asarray(values).ravel().tolist())
+    return ((number_format + separator) * len(values)) % values
+
+class VectorGenerator:
+    """
+        Generates a vector drawing of a path, the flight boundaries and the
+        search area, as SVG or PDF. Unlike ImageGenerator, it needs no
+        imaging library and does no rasterizing, so it suits headless
+        planning nodes. The drawing has the layout of ImageGenerator's
+        image.
+    """
+    BORDER_PX = 50
+    CHUNK_SIZE = 65536
+
+    def __init__(self, pathfinder):
+        self.pathfinder = pathfinder
+
+    def __normalize(self, size):
+        """
+            Returns the path, boundaries and search area in pixels, and the
+            size of the drawing including its border
+        """
+        if not size:
+            size = 1024, int(1024 * geometry_operations.compute_ratio(
+                    get_bounding_box(self.pathfinder.boundaries)))
+        boundaries = numpy.asarray(self.pathfinder.boundaries, dtype = float)
+        searcharea = numpy.asarray(self.pathfinder.get_searcharea(), dtype = float)
+        path, polygons = normalize_and_pad(self.pathfinder.get_path(),
+                numpy.vstack([boundaries.reshape(-1, 2), searcharea.reshape(-1, 2)]),
+                size, VectorGenerator.BORDER_PX)
+        padded_size = (size[0] + 2*VectorGenerator.BORDER_PX,
+                       size[1] + 2*VectorGenerator.BORDER_PX)
+        return path, polygons[:len(boundaries)], polygons[len(boundaries):], \
+               padded_size
+
+    @staticmethod
+    def __write(output, write_to, mode):
+        if output is None:
+            write_to(sys.stdout)
+        elif isinstance(output, basestring):
+            with open(output, mode) as output_file:
+                write_to(output_file)
+        else:
+            write_to(output)
+
+    def export_svg(self, output = None, size = None, precision = 1):
+        """
+            Writes the drawing as SVG to *output*, which is a file-like
+            object or the name of a file, or STDOUT if None. *size* is the
+            size of the drawing without its border, as for ImageGenerator.
+
+            Coordinates are rounded to *precision* decimal places, and
+            written as whole numbers of 10**-precision pixels, each relative
+            to the one before, which keeps the file small. If *precision* is
+            None, they are written exactly instead. The path is written a
+            chunk of waypoints at a time.
+        """
+        path, boundaries, searcharea, (width, height) = self.__normalize(size)
+        scale = 10 ** precision if precision is not None else 1
+
+        def path_data(points, close = False):
+            """
+                Yields the SVG path data of *points*, in pieces
+            """
+            if not len(points):
+                return
+            if precision is None:
+                yield "M%r %r" % tuple(points[0])
+                for start in xrange(1, len(points), VectorGenerator.CHUNK_SIZE):
+                    chunk = points[start:start + VectorGenerator.CHUNK_SIZE]
+                    yield "L" + _format_numbers(chunk, "%r", " ").rstrip()
+            else:
+                # Rounding first and then taking the differences keeps the
+                # rounding errors from adding up along the path
+                rounded = numpy.round(points * scale).astype(numpy.int64)
+                yield "M%d %d" % tuple(rounded[0])
+                for start in xrange(1, len(rounded), VectorGenerator.CHUNK_SIZE):
+                    deltas = numpy.diff(rounded[start - 1:start +
+                                                VectorGenerator.CHUNK_SIZE], axis = 0)
+                    yield "l" + _format_numbers(deltas, "%d", " ").rstrip()
+            if close:
+                yield "z"
+
+        def write_to(output_file):
+            output_file.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+                'viewBox="0 0 %d %d">\n'
+                '<rect width="100%%" height="100%%" fill="#FFFFFF"/>\n'
+                % (width, height, width * scale, height * scale))
+            for points, style in [
+                    (boundaries, 'fill="#999999"'),
+                    (searcharea, 'fill="none" stroke="#0000FF" stroke-width="%d"' % scale)]:
+                output_file.write('<path %s d="%s"/>\n' %
+                                  (style, "".join(path_data(points, True))))
+
+            output_file.write('<path fill="none" stroke="#000000" '
+                              'stroke-width="%d" d="' % scale)
+            for piece in path_data(path):
+                output_file.write(piece)
+            output_file.write('"/>\n'
+                              '</svg>\n')
+
+        VectorGenerator.__write(output, write_to, "w")
+
+    def export_pdf(self, output = None, size = None, precision = 1):
+        """
+            Writes the drawing as a one page PDF to *output*, which is a
+            file-like object or the name of a file, or STDOUT if None.
+            *size* is as for export_svg, in points. Coordinates are rounded
+            to *precision* decimal places, or written exactly if None. The
+            drawing is compressed with zlib.
+        """
+        path, boundaries, searcharea, (width, height) = self.__normalize(size)
+        number_format = "%r" if precision is None else "%%.%df" % precision
+
+        def path_operators(points, close):
+            """
+                Returns the PDF operators that trace *points*. PDF puts the
+                origin at the bottom left, so the y axis is flipped.
+            """
+            if not len(points):
+                return ""
+            points = numpy.column_stack([points[:, 0], height - points[:, 1]])
+            point = number_format + " " + number_format
+            operators = (point + " m\n" + (point + " l\n") * (len(points) - 1)) % \
+                        tuple(points.ravel().tolist())
+            return operators + ("h\n" if close else "")
+
+        content = zlib.compress(
+            "1 g\n0 0 %d %d re f\n" % (width, height) +
+            "0.6 g\n" + path_operators(boundaries, True) + "f\n" +
+            "0 0 1 RG\n1 w\n" + path_operators(searcharea, True) + "S\n" +
+            "0 G\n" + path_operators(path, False) + "S\n")
+
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents 4 0 R >>"
+                % (width, height),
+            "<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+                % (len(content), content)
+        ]
+
+        def write_to(output_file):
+            document = ["%PDF-1.4\n"]
+            offsets = []
+            position = len(document[0])
+            for number, body in enumerate(objects, 1):
+                text = "%d 0 obj\n%s\nendobj\n" % (number, body)
+                offsets.append(position)
+                document.append(text)
+                position += len(text)
+
+            document.append("xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+            document.extend("%010d 00000 n \n" % offset for offset in offsets)
+            document.append("trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                            % (len(objects) + 1, position))
+            output_file.write("".join(document))
+
+        VectorGenerator.__write(output, write_to, "wb")
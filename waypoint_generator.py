@@ -1,26 +1,82 @@
+import gzip
+import sys
+
+import numpy
+
 class WaypointGenerator:
     """
         Outputs the path waypoints to a format that QGroundControl can
-        understand. This outputs to STDOUT.
+        understand. This outputs to STDOUT unless given a file.
     """
     def __init__(self, pathfinder):
         self.pathfinder = pathfinder
 
-    def export_qgc_waypoints(self):
-        def print_header():
-            print "QGC WPL 110"
-        def print_home_location():
+    def get_waypoint_chunks(self, streaming = False):
+        """
+            Returns the waypoints to export, as a list of one Path. If
+            *streaming*, returns a generator that plans them chunk by chunk
+            as they are written instead, see Pathfinder.iter_path_chunks
+        """
+        if streaming:
+            return self.pathfinder.iter_path_chunks()
+        return [self.pathfinder.get_path()]
+
+    def format_qgc_waypoints(self, points, first_index = 1):
+        """
+            Returns the lines of the QGC file for the waypoints *points*, the
+            first of which is numbered *first_index*. All lines are
+            formatted by one % operation on a repeated line template, rather
+            than one at a time.
+        """
+        points = numpy.asarray(points, dtype = float).reshape(-1, 2)
+        altitude = "%.6f" % self.pathfinder.get_altitude()
+        line = "%d\t0\t3\t16\t0.000000\t0.000000\t0.000000\t0.000000\t" \
+               "%.6f\t%.6f\t" + altitude + "\t1\n"
+
+        values = numpy.empty((len(points), 3))
+        values[:, 0] = numpy.arange(first_index, first_index + len(points))
+        values[:, 1:] = points
+        return (line * len(points)) % tuple(values.ravel().tolist())
+
+    def export_qgc_waypoints(self, output = None, streaming = False,
+                             compress = None):
+        """
+            Writes the path in QGC format to *output*, which is a file-like
+            object or the name of a file, or STDOUT if None. The whole file
+            is written at once, or a chunk at a time if *streaming*.
+
+            If *compress*, the file is gzipped. By default, it is gzipped if
+            *output* is a file name ending in ".gz".
+        """
+        def format_header():
             home_lat, home_lon = self.pathfinder.plane_location
-            print "0\t1\t0\t16\t0\t0\t0\t0\t" + str(home_lat) + "\t" + \
-                    str(home_lon) + "\t300.000000\t1"
-        def print_path():
-            for index, (x, y) in enumerate(self.pathfinder.get_path()):
-                xstr = "%.6f" % x
-                ystr = "%.6f" % y
-                print str(index+1)\
-                    +"\t0\t3\t16\t0.000000\t0.000000\t0.000000\t0.000000\t"+\
-                    xstr+ "\t" + ystr + "\t300.000000\t1" 
-        
-        print_header()
-        print_home_location()
-        print_path()
+            return "QGC WPL 110\n" + \
+                   "0\t1\t0\t16\t0\t0\t0\t0\t" + str(home_lat) + "\t" + \
+                   str(home_lon) + "\t%.6f\t1\n" % self.pathfinder.get_altitude()
+
+        def write_to(output_file):
+            header = format_header()
+            first_index = 1
+            for chunk in self.get_waypoint_chunks(streaming):
+                output_file.write(header +
+                                  self.format_qgc_waypoints(chunk, first_index))
+                header = ""
+                first_index += len(chunk)
+
+        if output is None:
+            output = sys.stdout
+        if isinstance(output, basestring):
+            if compress is None:
+                compress = output.endswith(".gz")
+            output_file = gzip.open(output, "wb") if compress else open(output, "wb")
+        elif compress:
+            output_file = gzip.GzipFile(fileobj = output, mode = "wb")
+        else:
+            write_to(output)
+            return
+
+        try:
+            write_to(output_file)
+        finally:
+            # Closing a GzipFile around a file object leaves the file open
+            output_file.close()